@@ -0,0 +1,258 @@
+# baozimh.py
+"""命令行入口:
+    python -m baozimh download <漫画地址或名称> [--chapters 1-50] [--concurrency N] [--dry-run]
+    python -m baozimh repair [--root comic] [--concurrency N] [--dry-run]
+
+进度以 JSON Lines 输出到 stdout, 退出码: 0 全部成功, 1 有章节失败, 2 参数或解析错误, 130 被中断。
+不会导入 GUI 相关模块, 较重的模块在解析参数后才导入。
+"""
+import argparse
+import json
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+# 进度输出间隔 (秒)
+PROGRESS_INTERVAL = 1.0
+# 预估大小时抽样的章节数
+DRY_RUN_SAMPLE_CHAPTERS = 3
+
+
+def emit(event, **data):
+    """输出一行 JSON 事件"""
+    data = {"event": event, "time": round(time.time(), 3), **data}
+    sys.stdout.write(json.dumps(data, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+async def resolve_comic(target):
+    """漫画地址直接使用, 否则按名称搜索并取第一个结果, 返回 (漫画名, 漫画地址)"""
+    from downloader import search_baozimh
+    import asyncio
+
+    if target.startswith(("http://", "https://")):
+        return target.rstrip("/").rsplit("/", 1)[-1], target
+    results = await asyncio.to_thread(search_baozimh, target)
+    if not results:
+        return None, None
+    return results[0]["title"], results[0]["url"]
+
+
+async def estimate_image_size(img_links):
+    """对少量图片发送 HEAD 请求, 返回平均大小 (字节), 无法获取时返回 None"""
+    from downloader import get_image_session
+    import aiohttp
+
+    session = await get_image_session()
+    sizes = []
+    for link in img_links:
+        try:
+            async with session.head(link, allow_redirects=True, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                if response.status == 200 and response.content_length:
+                    sizes.append(response.content_length)
+        except Exception:
+            continue
+    return sum(sizes) / len(sizes) if sizes else None
+
+
+async def dry_run(chapters, concurrency):
+    """只获取图片链接, 统计图片数量和预计大小"""
+    import asyncio
+    from downloader import get_image_links
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def count(chapter):
+        async with semaphore:
+            return chapter, await get_image_links(chapter["url"])
+
+    total_images = 0
+    samples = []
+    for next_done in asyncio.as_completed([count(chapter) for chapter in chapters]):
+        chapter, img_links = await next_done
+        total_images += len(img_links)
+        if img_links and len(samples) < DRY_RUN_SAMPLE_CHAPTERS:
+            samples.append(img_links[0])
+        emit("chapter", name=chapter["name"], url=chapter["url"], images=len(img_links))
+    average_size = await estimate_image_size(samples)
+    return {
+        "chapters": len(chapters),
+        "images": total_images,
+        "estimated_bytes": int(average_size * total_images) if average_size else None,
+    }
+
+
+async def download(args):
+    from diagnostics import Diagnostics
+
+    diagnostics = Diagnostics.from_env(args.diagnostics is not None, args.diagnostics, args.profile)
+    if diagnostics:
+        diagnostics.start()
+    try:
+        return await _download(args)
+    finally:
+        if diagnostics:
+            emit("diagnostics", report=diagnostics.stop())
+
+
+async def _download(args):
+    import asyncio
+    import os
+    from downloader import get_chapter_list, close_session
+    from session_manager import session_manager
+    from task_manager import TaskManager
+    from utils import sanitize_filename, parse_chapter_range
+
+    comic_name, comic_url = await resolve_comic(args.target)
+    if not comic_url:
+        emit("error", message=f"没有找到漫画: {args.target}")
+        return EXIT_USAGE
+    comic_name = sanitize_filename(args.name or comic_name)
+
+    chapters = await asyncio.to_thread(get_chapter_list, comic_url)
+    if not chapters:
+        emit("error", message=f"获取章节列表失败: {comic_url}")
+        return EXIT_USAGE
+    try:
+        indexes = parse_chapter_range(args.chapters, len(chapters))
+    except ValueError as e:
+        emit("error", message=str(e))
+        return EXIT_USAGE
+    selected = [chapters[i] for i in indexes]
+    if not selected:
+        emit("error", message=f"章节范围 {args.chapters} 超出 1-{len(chapters)}")
+        return EXIT_USAGE
+    emit("resolved", comic=comic_name, url=comic_url, total_chapters=len(chapters), selected=len(selected))
+
+    # 图片连接池至少要容纳并发数
+    session_manager.image_limit = max(session_manager.image_limit, args.concurrency * 2)
+    if args.dry_run:
+        try:
+            summary = await dry_run(selected, args.concurrency)
+        finally:
+            await close_session()
+        emit("dry_run", **summary)
+        return EXIT_OK
+
+    task_manager = TaskManager(image_concurrency=args.concurrency)
+    comic_download_folder = os.path.join(args.output, comic_name)
+    reported = {"completed": 0, "error": 0}
+
+    def report_finished():
+        # 逐个输出新完成/出错的章节
+        for key, history in (("completed", task_manager.completed_tasks), ("error", task_manager.error_tasks)):
+            new = min(history.total - reported[key], len(history))
+            if new > 0:
+                for task in list(history)[-new:]:
+                    emit(f"chapter_{key}", name=task["chapter_name"], url=task["chapter_url"],
+                         images=task["total_images"], bytes=task["downloaded_size"])
+                reported[key] = history.total
+
+    task_manager.gui_update_callback = report_finished
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(args.interval)
+            emit("progress", **task_manager.get_progress())
+
+    reporter = asyncio.create_task(report_progress())
+    try:
+        for chapter in selected:
+            await task_manager.add_task(chapter["url"], chapter["name"], comic_download_folder, 0, [], comic_name)
+        await task_manager.wait_until_idle()
+    finally:
+        reporter.cancel()
+        await task_manager.close()
+    report_finished()
+
+    completed = task_manager.completed_tasks.total
+    failed = task_manager.error_tasks.total
+    emit("done", completed=completed, failed=failed, bytes=task_manager.stats.bytes_downloaded)
+    return EXIT_OK if not failed else EXIT_FAILED
+
+
+async def repair(args):
+    from diagnostics import Diagnostics
+    from downloader import close_session
+    from session_manager import session_manager
+    from repair import repair_library
+
+    diagnostics = Diagnostics.from_env(args.diagnostics is not None, args.diagnostics, args.profile)
+    if diagnostics:
+        diagnostics.start()
+    session_manager.image_limit = max(session_manager.image_limit, args.concurrency * 2)
+    last_report = 0.0
+
+    def report(stats):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report >= args.interval:
+            last_report = now
+            emit("progress", repaired=stats["repaired_images"], failed=stats["failed_images"],
+                 missing=stats["missing_images"], bytes=stats["downloaded_bytes"])
+
+    try:
+        stats = await repair_library(args.root, args.concurrency, args.dry_run, report)
+    finally:
+        await close_session()
+        if diagnostics:
+            emit("diagnostics", report=diagnostics.stop())
+    emit("done", **stats)
+    # 有需要重新下载或无法检查的文件夹时也返回非零, 让定时任务能发现
+    if stats["failed_images"] or stats["needs_redownload"] or stats["unresolved_folders"]:
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="baozimh", description="包子漫画下载器 (命令行)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    download_parser = subparsers.add_parser("download", help="下载一部漫画的章节")
+    download_parser.add_argument("target", help="漫画地址, 或按名称搜索 (取第一个结果)")
+    download_parser.add_argument("--chapters", help="章节范围, 从 1 开始, 例如 1-50,60,70- (默认全部)")
+    download_parser.add_argument("--concurrency", type=int, default=2, help="每个章节同时下载的图片数")
+    download_parser.add_argument("--name", help="保存用的漫画名 (默认使用搜索结果或地址)")
+    download_parser.add_argument("--output", default="comic", help="下载目录")
+    download_parser.add_argument("--dry-run", action="store_true", help="只统计图片数量和预计大小, 不下载")
+    download_parser.add_argument("--interval", type=float, default=PROGRESS_INTERVAL, help="进度输出间隔 (秒)")
+
+    repair_parser = subparsers.add_parser("repair", help="检查已下载的章节, 只补全缺失的图片")
+    repair_parser.add_argument("--root", default="comic", help="下载目录")
+    repair_parser.add_argument("--concurrency", type=int, default=8, help="全局同时下载的图片数")
+    repair_parser.add_argument("--dry-run", action="store_true", help="只统计缺失的图片, 不下载")
+    repair_parser.add_argument("--interval", type=float, default=PROGRESS_INTERVAL, help="进度输出间隔 (秒)")
+    for subparser in (download_parser, repair_parser):
+        subparser.add_argument("--diagnostics", nargs="?", const="", metavar="REPORT",
+                               help="开启诊断模式 (事件循环延迟/慢回调), 可指定报告文件")
+        subparser.add_argument("--profile", action="store_true", help="诊断模式下同时记录 cProfile")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.concurrency < 1:
+        emit("error", message="--concurrency 必须大于 0")
+        return EXIT_USAGE
+
+    import asyncio
+    from utils import windows_asyncio_fix
+
+    windows_asyncio_fix()
+    try:
+        if args.command == "download":
+            return asyncio.run(download(args))
+        if args.command == "repair":
+            return asyncio.run(repair(args))
+    except KeyboardInterrupt:
+        emit("interrupted")
+        return EXIT_INTERRUPTED
+    return EXIT_USAGE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
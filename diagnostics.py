@@ -0,0 +1,231 @@
+# diagnostics.py
+"""诊断模式: 检测阻塞事件循环的慢回调, 持续采样循环延迟, 可选 cProfile, 结束时写出报告文件
+
+通过环境变量 BAOZIMH_DIAGNOSTICS=1 (或报告文件路径) 开启, BAOZIMH_PROFILE=1 同时开启 cProfile;
+命令行程序也可以使用 --diagnostics / --profile 参数。
+"""
+import asyncio
+import collections
+import cProfile
+import datetime
+import io
+import logging
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+import traceback
+from utils import setup_logger
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+DIAGNOSTICS_ENV = "BAOZIMH_DIAGNOSTICS"
+PROFILE_ENV = "BAOZIMH_PROFILE"
+REPORT_DIR = "diagnostics"
+
+SLOW_CALLBACK_DURATION = 0.2  # 单个回调超过该时间 (秒) 视为慢回调
+LAG_INTERVAL = 0.1  # 循环延迟的采样间隔 (秒)
+STALL_THRESHOLD = 0.25  # 超过该时间 (秒) 没有心跳时, 看门狗线程开始采样循环线程的调用栈
+WATCHDOG_INTERVAL = 0.05  # 看门狗线程的检查间隔 (秒)
+STACK_DEPTH = 8  # 每个调用栈样本保留的帧数
+REPORT_TOP = 20  # 报告中每一部分列出的条目数
+MAX_LAG_SAMPLES = 100000
+
+
+def _percentile(ordered, percentile):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """收集 asyncio 调试模式输出的 "Executing <Handle ...> took N seconds" 记录"""
+
+    def __init__(self, diagnostics):
+        super().__init__(logging.WARNING)
+        self.diagnostics = diagnostics
+
+    def emit(self, record):
+        if record.msg == "Executing %s took %.3f seconds" and len(record.args) == 2:
+            handle, seconds = record.args
+            self.diagnostics.record_slow_callback(str(handle), seconds)
+
+
+class Diagnostics:
+    """一次运行的诊断数据, start() 需要在事件循环内调用"""
+
+    def __init__(self, report_path=None, profile=False, slow_callback_duration=SLOW_CALLBACK_DURATION,
+                 lag_interval=LAG_INTERVAL, stall_threshold=STALL_THRESHOLD):
+        if not report_path:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            report_path = os.path.join(REPORT_DIR, f"report_{timestamp}.txt")
+        self.report_path = report_path
+        self.profile = profile
+        self.slow_callback_duration = slow_callback_duration
+        self.lag_interval = lag_interval
+        self.stall_threshold = stall_threshold
+
+        self.lag_samples = collections.deque(maxlen=MAX_LAG_SAMPLES)
+        self.slow_callbacks = collections.defaultdict(lambda: [0, 0.0, 0.0])  # 描述 -> [次数, 总时间, 最长时间]
+        self.stall_stacks = collections.Counter()  # 调用栈 -> 样本数
+        self.stalls = []  # (开始时间, 持续时间)
+
+        self._loop = None
+        self._loop_thread_id = None
+        self._heartbeat = time.monotonic()
+        self._started = None
+        self._sampler = None
+        self._watchdog = None
+        self._stopping = threading.Event()
+        self._handler = None
+        self._profiler = None
+        self._previous_debug = None
+
+    @classmethod
+    def from_env(cls, enabled=False, report_path=None, profile=False):
+        """按参数和环境变量创建, 未开启时返回 None"""
+        env = os.environ.get(DIAGNOSTICS_ENV, "")
+        profile = profile or os.environ.get(PROFILE_ENV, "") not in ("", "0")
+        if not (enabled or profile or env not in ("", "0")):
+            return None
+        if not report_path and env not in ("", "0", "1"):
+            report_path = env
+        return cls(report_path=report_path, profile=profile)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._started = time.monotonic()
+        self._heartbeat = self._started
+
+        # asyncio 调试模式会记录超过 slow_callback_duration 的回调
+        self._previous_debug = self._loop.get_debug()
+        self._loop.set_debug(True)
+        self._loop.slow_callback_duration = self.slow_callback_duration
+        self._handler = _SlowCallbackHandler(self)
+        logging.getLogger("asyncio").addHandler(self._handler)
+
+        self._sampler = self._loop.create_task(self._sample_lag())
+        self._watchdog = threading.Thread(target=self._watch, name="diagnostics-watchdog", daemon=True)
+        self._watchdog.start()
+
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        logger.info(f"诊断模式已开启, 报告文件: {self.report_path}")
+
+    def record_slow_callback(self, handle, seconds):
+        entry = self.slow_callbacks[handle]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+    async def _sample_lag(self):
+        while True:
+            expected = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self.lag_samples.append(max(0.0, now - expected))
+
+    def _watch(self):
+        """看门狗线程: 循环长时间没有心跳时采样循环线程当前的调用栈"""
+        stall_start = None
+        while not self._stopping.wait(WATCHDOG_INTERVAL):
+            now = time.monotonic()
+            if now - self._heartbeat < self.stall_threshold:
+                if stall_start is not None:
+                    self.stalls.append((stall_start - self._started, now - stall_start))
+                    stall_start = None
+                continue
+            if stall_start is None:
+                stall_start = self._heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+            self.stall_stacks[tuple(f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in stack)] += 1
+
+    def stop(self):
+        """停止采样并写出报告, 返回报告路径"""
+        if self._profiler:
+            self._profiler.disable()
+        self._stopping.set()
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+        if self._sampler:
+            self._sampler.cancel()
+        if self._handler:
+            logging.getLogger("asyncio").removeHandler(self._handler)
+        if self._loop and not self._loop.is_closed():
+            self._loop.set_debug(self._previous_debug)
+
+        try:
+            directory = os.path.dirname(self.report_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.report_path, "w", encoding="utf-8") as f:
+                f.write(self.format_report())
+            if self._profiler:
+                self._profiler.dump_stats(os.path.splitext(self.report_path)[0] + ".prof")
+            logger.info(f"诊断报告已写入: {self.report_path}")
+        except OSError as e:
+            logger.error(f"写入诊断报告失败: {e}")
+        return self.report_path
+
+    def format_report(self):
+        lines = []
+        duration = time.monotonic() - self._started if self._started else 0.0
+        lines.append("== 诊断报告 ==")
+        lines.append(f"时间: {datetime.datetime.now().isoformat(timespec='seconds')}")
+        lines.append(f"运行时长: {duration:.1f} 秒")
+        lines.append(f"Python: {sys.version.split()[0]}, 平台: {platform.platform()}")
+        lines.append(f"参数: 慢回调阈值 {self.slow_callback_duration}s, 采样间隔 {self.lag_interval}s, "
+                     f"卡顿阈值 {self.stall_threshold}s")
+
+        ordered = sorted(self.lag_samples)
+        lines.append("")
+        lines.append("== 事件循环延迟 ==")
+        if ordered:
+            mean = sum(ordered) / len(ordered)
+            lines.append(f"样本数 {len(ordered)}, 平均 {mean * 1000:.1f} ms, p50 {_percentile(ordered, 0.5) * 1000:.1f} ms, "
+                         f"p95 {_percentile(ordered, 0.95) * 1000:.1f} ms, p99 {_percentile(ordered, 0.99) * 1000:.1f} ms, "
+                         f"最大 {ordered[-1] * 1000:.1f} ms")
+        else:
+            lines.append("没有样本")
+
+        lines.append("")
+        lines.append(f"== 慢回调 (超过 {self.slow_callback_duration}s, 按总时间排序) ==")
+        slow = sorted(self.slow_callbacks.items(), key=lambda item: item[1][1], reverse=True)
+        for handle, (count, total, longest) in slow[:REPORT_TOP]:
+            lines.append(f"{total:8.3f}s 共 {count} 次, 最长 {longest:.3f}s: {handle}")
+        if not slow:
+            lines.append("没有")
+
+        lines.append("")
+        lines.append(f"== 卡顿 (超过 {self.stall_threshold}s 没有心跳) ==")
+        if self.stalls:
+            longest = sorted(self.stalls, key=lambda stall: stall[1], reverse=True)
+            lines.append(f"共 {len(self.stalls)} 次, 总计 {sum(d for _, d in self.stalls):.2f}s")
+            for offset, stall_duration in longest[:REPORT_TOP]:
+                lines.append(f"  开始于 {offset:.2f}s, 持续 {stall_duration:.3f}s")
+        else:
+            lines.append("没有")
+        total_samples = sum(self.stall_stacks.values())
+        if total_samples:
+            lines.append("")
+            lines.append(f"== 卡顿时循环线程的调用栈 (每 {WATCHDOG_INTERVAL}s 一个样本, 共 {total_samples} 个) ==")
+            for stack, count in self.stall_stacks.most_common(REPORT_TOP):
+                lines.append(f"{count} 个样本 ({count * WATCHDOG_INTERVAL:.2f}s):")
+                lines.extend(f"    {frame}" for frame in stack)
+
+        if self._profiler:
+            lines.append("")
+            lines.append("== cProfile (按累计时间排序) ==")
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats("cumulative").print_stats(REPORT_TOP * 2)
+            lines.append(stream.getvalue())
+        return "\n".join(lines) + "\n"
@@ -6,7 +6,18 @@ from bs4 import BeautifulSoup
 import os
 import re
 import json
-from utils import sanitize_filename, setup_logger, MAX_CONCURRENT_DOWNLOADS
+import copy
+import threading
+import time
+from utils import (
+    sanitize_filename, setup_logger, MAX_CONCURRENT_DOWNLOADS, MAX_CONCURRENT_IMAGES, DEFAULT_HEADERS,
+    CONNECT_TIMEOUT, FIRST_BYTE_TIMEOUT, READ_IDLE_TIMEOUT, MIN_DOWNLOAD_SPEED, SPEED_CHECK_WINDOW,
+    DOWNLOAD_CHUNK_SIZE, SingleFlight, ByteBudget
+)
+from session_manager import session_manager
+from link_cache import link_cache
+from hedge import Hedger
+from urllib.parse import urlsplit
 import aiofiles
 import random
 
@@ -33,27 +44,99 @@ DEFAULT_MIRRORS = {
 # 当前使用的镜像源
 current_source = "default"
 
+# 配置文件 mtime 检查的最小间隔 (秒), 间隔内的读取完全走内存
+MIRRORS_RELOAD_INTERVAL = 2.0
+
+
+class MirrorConfig:
+    """镜像源配置 (内存缓存, 仅在文件 mtime 变化时重新加载, 原子写入)"""
+
+    def __init__(self, path=MIRRORS_CONFIG_FILE, reload_interval=MIRRORS_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._mirrors = None
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_from_disk(self):
+        mtime = self._file_mtime()
+        if mtime is None:
+            # 如果配置文件不存在，使用默认配置并保存
+            self._mirrors = copy.deepcopy(DEFAULT_MIRRORS)
+            self._write(self._mirrors)
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._mirrors = json.load(f)
+            self._mtime = mtime
+            logger.debug(f"已加载镜像源配置: {self.path}")
+        except Exception as e:
+            logger.error(f"加载镜像源配置失败: {e}")
+            if self._mirrors is None:
+                self._mirrors = copy.deepcopy(DEFAULT_MIRRORS)
+            # 记录 mtime, 避免对同一个损坏的文件反复解析
+            self._mtime = mtime
+
+    def _write(self, mirrors):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(mirrors, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.path)
+            self._mtime = self._file_mtime()
+        except Exception as e:
+            logger.error(f"保存镜像源配置失败: {e}")
+
+    def _ensure_fresh(self):
+        # 两次 mtime 检查之间的读取完全走内存, 热点路径上不做文件 I/O
+        now = time.monotonic()
+        if self._mirrors is not None and now - self._last_check < self.reload_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            if self._mirrors is None or self._file_mtime() != self._mtime:
+                self._load_from_disk()
+
+    def get_all(self):
+        """返回所有镜像源 (副本, 调用方修改不会影响缓存)"""
+        self._ensure_fresh()
+        return copy.deepcopy(self._mirrors)
+
+    def get(self, key, default=None):
+        """返回单个镜像源 (只读, 不要修改返回值)"""
+        self._ensure_fresh()
+        return self._mirrors.get(key, default)
+
+    def save(self, mirrors):
+        """替换全部镜像源并原子写入磁盘"""
+        with self._lock:
+            self._mirrors = copy.deepcopy(mirrors)
+            self._last_check = time.monotonic()
+            self._write(self._mirrors)
+
+    def reload(self):
+        """强制从磁盘重新加载"""
+        with self._lock:
+            self._last_check = time.monotonic()
+            self._load_from_disk()
+
+
+mirror_config = MirrorConfig()
+
 def load_mirrors():
     """加载镜像源配置"""
-    try:
-        if os.path.exists(MIRRORS_CONFIG_FILE):
-            with open(MIRRORS_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            # 如果配置文件不存在，使用默认配置并保存
-            save_mirrors(DEFAULT_MIRRORS)
-            return DEFAULT_MIRRORS
-    except Exception as e:
-        logger.error(f"加载镜像源配置失败: {e}")
-        return DEFAULT_MIRRORS
+    return mirror_config.get_all()
 
 def save_mirrors(mirrors):
     """保存镜像源配置"""
-    try:
-        with open(MIRRORS_CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(mirrors, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        logger.error(f"保存镜像源配置失败: {e}")
+    mirror_config.save(mirrors)
 
 def get_all_mirrors():
     """获取所有可用的镜像源"""
@@ -92,17 +175,16 @@ def remove_mirror(key):
 def set_mirror_source(source_key):
     """设置当前使用的镜像源"""
     global current_source
-    mirrors = load_mirrors()
-    if source_key in mirrors:
+    mirror = mirror_config.get(source_key)
+    if mirror is not None:
         current_source = source_key
-        logger.info(f"已切换到镜像源: {mirrors[source_key]['name']}")
-        return True, f"已切换到: {mirrors[source_key]['name']}"
+        logger.info(f"已切换到镜像源: {mirror['name']}")
+        return True, f"已切换到: {mirror['name']}"
     return False, "镜像源不存在"
 
 def get_current_mirror():
     """获取当前镜像源信息"""
-    mirrors = load_mirrors()
-    return mirrors.get(current_source, DEFAULT_MIRRORS["default"])
+    return mirror_config.get(current_source, DEFAULT_MIRRORS["default"])
 
 def get_base_url():
     """获取当前镜像源的基础URL"""
@@ -111,38 +193,169 @@ def get_base_url():
 # 初始化：加载镜像源配置
 MIRROR_SOURCES = load_mirrors()
 
-# 限制并发下载数量
-# semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)  # 不需要了
-
-# 全局 aiohttp ClientSession (模块级别)
-session = None
-
 async def get_session():
-    global session
-    if session is None or session.closed:
-        logger.info("创建新的全局 session")
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        session = aiohttp.ClientSession(headers=headers, connector=aiohttp.TCPConnector(limit=1)) #限制连接数为1
-    return session
+    """网页请求使用的 session (兼容旧接口)"""
+    return await session_manager.html_session()
+
+async def get_image_session():
+    """图片请求使用的 session"""
+    return await session_manager.image_session()
 
 async def close_session():
-    global session
-    if session and not session.closed:
-        await session.close()
+    await session_manager.close()
+
+# 合并并发的相同请求 (single-flight), 成功的结果短暂缓存
+FETCH_CACHE_TTL = 30  # 网页内容缓存时间 (秒)
+LINKS_CACHE_TTL = 120  # 章节列表/图片链接缓存时间 (秒)
+FETCH_TIMEOUT = 30  # 单次网页请求的超时 (秒), 避免卡住的镜像长期占用网页连接池
+fetch_flight = SingleFlight(cache_ttl=FETCH_CACHE_TTL, cache_size=32)
+chapter_list_flight = SingleFlight(cache_ttl=LINKS_CACHE_TTL)
+image_links_flight = SingleFlight(cache_ttl=LINKS_CACHE_TTL)
+
 
-async def fetch(url, headers):  # 简化 fetch，不再需要传入 session
-    """异步获取网页内容 (辅助函数)"""
+async def fetch(url, headers=None, read_timeout=None):  # 简化 fetch，不再需要传入 session
+    """异步获取网页内容 (辅助函数, 相同 URL 的并发请求只发出一次)
+
+    read_timeout: 建立连接和等待数据各自的超时 (秒), 从拿到连接池中的连接后才开始计时
+    """
+    key = url if not headers else (url, tuple(sorted(headers.items())))
+    return await fetch_flight.do(key, lambda: _fetch(url, headers, read_timeout))
+
+
+async def _fetch(url, headers=None, read_timeout=None):
     logger.debug(f"Fetching URL: {url}")
     session = await get_session() # 获取全局 session
-    async with session.get(url, headers=headers) as response:
+    timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT, sock_connect=read_timeout, sock_read=read_timeout)
+    async with session.get(url, headers=headers, timeout=timeout) as response:
         response.raise_for_status()
         return await response.read()
 
-async def download_image(img_link, download_folder, i, headers, progress_callback=None, retry=2):
-    """异步下载单张图片"""
-    file_name = os.path.join(download_folder, f"image_{i + 1}.jpg")
+# 对冲请求 (图片按 CDN 主机统计延迟, 网页按镜像主机统计)
+image_hedger = Hedger("图片")
+page_hedger = Hedger("网页")
+
+
+def alternate_mirror_url(url):
+    """把镜像站上的 URL 换成另一个镜像上的相同路径, 没有其他镜像时返回 None"""
+    mirrors = mirror_config.get_all().values()
+    for mirror in mirrors:
+        base_url = mirror["base_url"]
+        if url.startswith(base_url + "/"):
+            path = url[len(base_url):]
+            for other in mirrors:
+                if other["base_url"] != base_url:
+                    return other["base_url"] + path
+    return None
+
+
+async def fetch_page(url):
+    """获取网页, 慢请求会对冲到另一个镜像"""
+    alternate = alternate_mirror_url(url)
+    if alternate:
+        backup = lambda: fetch(alternate)
+    else:
+        # 只有一个镜像时绕过 single-flight, 否则备用请求会合并到原请求上, 白白消耗对冲预算
+        backup = lambda: _fetch(url)
+    return await page_hedger.run(urlsplit(url).netloc, lambda: fetch(url), backup)
+
+
+class StalledTransferError(Exception):
+    """传输速度低于 MIN_DOWNLOAD_SPEED"""
+
+
+async def fetch_image(img_link, headers=None, min_speed=MIN_DOWNLOAD_SPEED, transfer_callback=None):
+    """下载图片内容: 连接/首字节/读取空闲分别超时, 并中断速度过低的传输
+
+    transfer_callback(nbytes) 在收到数据时调用; 请求失败或被取消 (例如对冲中落败) 时,
+    用负数撤回这次请求已经报告的字节, 只有成功的请求计入进度
+    """
+    if transfer_callback is None:
+        return await _fetch_image_with_egress(img_link, headers, min_speed, None)
+
+    received = 0
+
+    def on_chunk(nbytes):
+        nonlocal received
+        received += nbytes
+        transfer_callback(nbytes)
+
+    try:
+        return await _fetch_image_with_egress(img_link, headers, min_speed, on_chunk)
+    except BaseException:
+        if received:
+            transfer_callback(-received)
+        raise
+
+
+async def _fetch_image_with_egress(img_link, headers, min_speed, transfer_callback):
+    # 配置了出口代理时按健康状况选择一个代理, 并记录这次请求的结果
+    session, proxy = await session_manager.image_egress()
+    if proxy is None:
+        return await _fetch_image(session, img_link, headers, min_speed, transfer_callback)
+
+    proxy_pool = session_manager.proxy_pool
+    started = time.monotonic()
+    proxy.in_flight += 1
+    try:
+        data = await _fetch_image(session, img_link, headers, min_speed, transfer_callback)
+    except Exception as e:
+        if proxy_pool.is_proxy_failure(e):
+            proxy_pool.record_failure(proxy, e)
+        raise
+    finally:
+        proxy.in_flight -= 1
+    proxy_pool.record_success(proxy, len(data), time.monotonic() - started, img_link)
+    return data
+
+
+async def _fetch_image(session, img_link, headers, min_speed, transfer_callback):
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_IDLE_TIMEOUT)
+    # session.get 在收到响应头后返回, 这里限制的是 连接 + 首字节 的时间
+    response = await asyncio.wait_for(
+        session.get(img_link, headers=headers, timeout=timeout),
+        CONNECT_TIMEOUT + FIRST_BYTE_TIMEOUT,
+    )
+    async with response:
+        response.raise_for_status()
+        data = bytearray()
+        window_start = time.monotonic()
+        window_bytes = 0
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            data += chunk
+            window_bytes += len(chunk)
+            if transfer_callback:
+                transfer_callback(len(chunk))
+            elapsed = time.monotonic() - window_start
+            if elapsed >= SPEED_CHECK_WINDOW:
+                speed = window_bytes / elapsed
+                if min_speed and speed < min_speed:
+                    raise StalledTransferError(f"传输速度过低: {speed:.0f} B/s < {min_speed} B/s")
+                window_start += elapsed
+                window_bytes = 0
+        return bytes(data)
+
+
+# 每个章节文件夹中记录图片列表的文件, 用于之后检查和补全缺失的图片
+CHAPTER_METADATA_FILE = ".chapter.json"
+
+
+def image_file_name(download_folder, i):
+    return os.path.join(download_folder, f"image_{i + 1}.jpg")
+
+
+# 所有章节共享的内存预算: 图片从开始下载到写入磁盘之间都占用预算
+image_byte_budget = ByteBudget()
+
+
+async def download_image(img_link, download_folder, i, headers=None, progress_callback=None, retry=2,
+                         transfer_callback=None, chapter_url=None):
+    """异步下载单张图片
+
+    progress_callback(downloaded, total) 在每张图片结束时调用,
+    transfer_callback(nbytes, image_size=None) 在收到数据和图片下载完成时调用,
+    图片 404 时不再重试, 并丢弃 chapter_url 的图片链接缓存
+    """
+    file_name = image_file_name(download_folder, i)
 
     if os.path.exists(file_name):
         logger.info(f"图片已存在，跳过下载: {file_name}")
@@ -152,20 +365,35 @@ async def download_image(img_link, download_folder, i, headers, progress_callbac
 
     for attempt in range(retry):
         try:
-            session = await get_session()
-            async with session.get(img_link, headers=headers, timeout=aiohttp.ClientTimeout(total=60)) as response:
-                response.raise_for_status()
-                img_data = await response.read()
-                
+            # 磁盘写入跟不上时在这里等待, 不再开始新的下载
+            async with image_byte_budget.reserve() as reservation:
+                # 慢请求会在另一个连接上对冲
+                img_data = await image_hedger.run(
+                    urlsplit(img_link).netloc,
+                    lambda: fetch_image(img_link, headers, transfer_callback=transfer_callback),
+                )
+                reservation.resize(len(img_data))
+
                 async with aiofiles.open(file_name, 'wb') as handler:
                     await handler.write(img_data)
-                
-                logger.info(f"已下载: {file_name}")
-                if progress_callback:
-                    progress_callback(1, 1)  # 成功下载一张
-                return  # 下载成功, 结束重试
 
-        except (aiohttp.ClientError, aiohttp.http_exceptions.TransferEncodingError, ConnectionResetError, asyncio.TimeoutError) as e:
+            logger.info(f"已下载: {file_name}")
+            if transfer_callback:
+                transfer_callback(0, len(img_data))
+            if progress_callback:
+                progress_callback(1, 1)  # 成功下载一张
+            return  # 下载成功, 结束重试
+
+        except (aiohttp.ClientError, aiohttp.http_exceptions.TransferEncodingError, ConnectionResetError,
+                asyncio.TimeoutError, StalledTransferError) as e:
+            if isinstance(e, aiohttp.ClientResponseError) and e.status == 404:
+                # 链接已失效, 重试没有意义
+                logger.error(f"图片不存在 (404): {img_link}")
+                if chapter_url:
+                    invalidate_image_links(chapter_url)
+                if progress_callback:
+                    progress_callback(0, 1)
+                return
             logger.warning(f"下载图片 {img_link} 失败 (尝试 {attempt + 1}/{retry}): {e}")
             if attempt < retry - 1:
                 await asyncio.sleep(random.uniform(1, 3))  # 随机延迟 1-3 秒
@@ -179,9 +407,7 @@ async def download_image(img_link, download_folder, i, headers, progress_callbac
             # 删除未下载完成的文件
             if os.path.exists(file_name):
                 os.remove(file_name)
-            if progress_callback:
-                progress_callback(0, 1)
-            return
+            raise  # 继续向上传递, 让整个章节立即停止
 
         except Exception as e:
             logger.error(f"下载图片时发生未知错误: {img_link}, 错误: {e}", exc_info=True)
@@ -189,37 +415,76 @@ async def download_image(img_link, download_folder, i, headers, progress_callbac
                 progress_callback(0, 1)
             return
 
-async def download_images_async(img_links, download_folder, progress_callback=None):
+def write_chapter_metadata(download_folder, chapter_url, img_links):
+    """写入章节的图片列表 (原子写入)"""
+    path = os.path.join(download_folder, CHAPTER_METADATA_FILE)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"chapter_url": chapter_url, "images": img_links}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"写入章节信息失败: {path}, 错误: {e}")
+
+
+def read_chapter_metadata(download_folder):
+    """读取章节的图片列表, 不存在或损坏时返回 None"""
+    path = os.path.join(download_folder, CHAPTER_METADATA_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取章节信息失败: {path}, 错误: {e}")
+        return None
+    if not isinstance(metadata, dict) or not isinstance(metadata.get("images"), list):
+        return None
+    return metadata
+
+
+async def download_images_async(img_links, download_folder, progress_callback=None, transfer_callback=None,
+                                concurrency=MAX_CONCURRENT_IMAGES, chapter_url=None):
     """异步下载图片 (修改版, 接收 img_links)"""
     logger.info(f"开始下载到文件夹: {download_folder}")
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
     if not os.path.exists(download_folder):
         os.makedirs(download_folder)
+    if img_links:
+        write_chapter_metadata(download_folder, chapter_url, img_links)
 
-    # 使用信号量控制并发数量为2
-    semaphore = asyncio.Semaphore(2)
-    
-    async def download_with_semaphore(img_link, i):
-        async with semaphore:
-            return await download_image(img_link, download_folder, i, headers, progress_callback)
-    
-    # 创建下载任务
-    tasks = [
-       asyncio.create_task(download_with_semaphore(img_link, i))
-       for i, img_link in enumerate(img_links)
-    ]
-    
-    # 添加一个小的延迟，确保任务能开始执行
-    await asyncio.sleep(0.1)
-    
-    # 等待所有任务完成
-    await asyncio.gather(*tasks, return_exceptions=True)
+    # 只创建 concurrency 个 worker, 依次从共享的迭代器取下一张图片, 不为每张图片预先创建任务
+    pending = iter(enumerate(img_links))
+
+    async def worker():
+        for i, img_link in pending:
+            await download_image(img_link, download_folder, i, progress_callback=progress_callback,
+                                 transfer_callback=transfer_callback, chapter_url=chapter_url)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(img_links))))]
+
+    # 等待所有 worker 完成
+    await asyncio.gather(*workers, return_exceptions=True)
     logger.info(f"下载完成 (或发生错误/取消): {download_folder}")
 
 
 # --- 以下是原 no_ui_version.py 中的函数 --- (这些函数保持不变) ---
+def parse_search_results(html, base_url):
+    """解析搜索结果页"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    comic_items = soup.find_all("a", class_="comics-card__poster")
+
+    results = []
+    for item in comic_items:
+        title = item["title"] if item.has_attr("title") else "标题未找到"
+        comic_url = base_url + item["href"] if item.has_attr("href") else None
+
+        if title and comic_url:
+            results.append({"title": title, "url": comic_url})
+            logger.debug(f"找到漫画: {title}, URL: {comic_url}")
+    return results
+
+
 def search_baozimh(keyword):
     """在漫画网站上搜索漫画并返回结果 (同步函数)"""
     logger.info(f"搜索漫画: {keyword}")
@@ -228,21 +493,9 @@ def search_baozimh(keyword):
     params = {"q": keyword}
 
     try:
-        response = requests.get(search_url, params=params)
+        response = requests.get(search_url, params=params, headers=DEFAULT_HEADERS)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        comic_items = soup.find_all("a", class_="comics-card__poster")
-
-        results = []
-        for item in comic_items:
-            title = item["title"] if item.has_attr("title") else "标题未找到"
-            comic_url = base_url + item["href"] if item.has_attr("href") else None
-
-            if title and comic_url:
-                results.append({"title": title, "url": comic_url})
-                logger.debug(f"找到漫画: {title}, URL: {comic_url}")
-
+        results = parse_search_results(response.text, base_url)
         logger.info(f"搜索到 {len(results)} 个结果")
         return results
 
@@ -254,40 +507,49 @@ def search_baozimh(keyword):
         return []
 
 
+def parse_chapter_list(html, base_url):
+    """解析漫画详情页中的章节列表"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    chapters = []
+
+    chapter_items1 = soup.find("div", id="chapter-items")
+    if chapter_items1:
+        chapter_items1 = chapter_items1.find_all("a", class_="comics-chapters__item")
+        for item in chapter_items1:
+            chapter_url = base_url + item["href"]
+            chapter_name = item.find("span").text.strip()
+            chapters.append({"name": chapter_name, "url": chapter_url})
+            logger.debug(f"找到章节: {chapter_name}, URL: {chapter_url}")
+
+    chapter_items2 = soup.find("div", id="chapters_other_list")
+    if chapter_items2:
+        chapter_items2 = chapter_items2.find_all("a", class_="comics-chapters__item")
+        for item in chapter_items2:
+            chapter_url = base_url + item["href"]
+            span = item.find("span")
+            if span:
+                chapter_name = span.text.strip()
+            else:
+                chapter_name = "章节名称未找到"
+            chapters.append({"name": chapter_name, "url": chapter_url})
+            logger.debug(f"找到章节: {chapter_name}, URL: {chapter_url}")
+    return chapters
+
+
 def get_chapter_list(comic_url):
-    """从漫画详情页获取章节列表 (同步函数)"""
+    """从漫画详情页获取章节列表 (同步函数, 相同漫画的并发请求只发出一次)"""
+    return list(chapter_list_flight.do_sync(comic_url, lambda: _get_chapter_list(comic_url)))
+
+
+def _get_chapter_list(comic_url):
     logger.info(f"获取章节列表: {comic_url}")
     base_url = get_base_url()
     
     try:
-        response = requests.get(comic_url)
+        response = requests.get(comic_url, headers=DEFAULT_HEADERS)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        chapters = []
-
-        chapter_items1 = soup.find("div", id="chapter-items")
-        if chapter_items1:
-            chapter_items1 = chapter_items1.find_all("a", class_="comics-chapters__item")
-            for item in chapter_items1:
-                chapter_url = base_url + item["href"]
-                chapter_name = item.find("span").text.strip()
-                chapters.append({"name": chapter_name, "url": chapter_url})
-                logger.debug(f"找到章节: {chapter_name}, URL: {chapter_url}")
-
-        chapter_items2 = soup.find("div", id="chapters_other_list")
-        if chapter_items2:
-            chapter_items2 = chapter_items2.find_all("a", class_="comics-chapters__item")
-            for item in chapter_items2:
-                chapter_url = base_url + item["href"]
-                span = item.find("span")
-                if span:
-                    chapter_name = span.text.strip()
-                else:
-                    chapter_name = "章节名称未找到"
-                chapters.append({"name": chapter_name, "url": chapter_url})
-                logger.debug(f"找到章节: {chapter_name}, URL: {chapter_url}")
-
+        chapters = parse_chapter_list(response.text, base_url)
         logger.info(f"获取到 {len(chapters)} 个章节")
         return chapters
 
@@ -299,14 +561,26 @@ def get_chapter_list(comic_url):
         return []
 
 async def get_image_links(chapter_url):
-    """从章节 URL 获取图片链接列表 (异步函数)"""
+    """从章节 URL 获取图片链接列表 (异步函数, 先查磁盘缓存, 相同章节的并发请求只发出一次)"""
+    img_links = link_cache.get(chapter_url)
+    if img_links:
+        logger.info(f"使用缓存的图片链接: {chapter_url}, 共 {len(img_links)} 张")
+        return img_links
+    return list(await image_links_flight.do(chapter_url, lambda: _get_image_links(chapter_url)))
+
+
+def invalidate_image_links(chapter_url):
+    """丢弃章节的图片链接缓存 (图片 404 时调用, 下次重新解析章节页)"""
+    logger.info(f"图片链接已失效: {chapter_url}")
+    link_cache.invalidate(chapter_url)
+    image_links_flight.forget(chapter_url)
+
+
+async def _get_image_links(chapter_url):
     logger.info(f"获取图片链接: {chapter_url}")
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
 
     try:
-        response_text = await fetch(chapter_url, headers)
+        response_text = await fetch_page(chapter_url)
         soup = BeautifulSoup(response_text.decode('utf-8', 'ignore'), 'html.parser')
 
         img_tags = soup.find_all('amp-img')
@@ -320,8 +594,9 @@ async def get_image_links(chapter_url):
                 if data_src and "baozicdn.com/scomic" in data_src:
                     img_links.append(data_src)
 
-        img_links = list(set(img_links))  # 去重
+        img_links = list(dict.fromkeys(img_links))  # 去重并保持页面中的顺序
         logger.info(f"找到 {len(img_links)} 张图片")
+        link_cache.set(chapter_url, img_links)
         return img_links
 
     except Exception as e:
@@ -60,6 +60,7 @@ def create_main_layout():
         [
             sg.Button("下载选中", key="-DOWNLOAD-", disabled=True),
             sg.Button("下载全部", key="-DOWNLOAD_ALL-", disabled=True),
+            sg.Checkbox("最新章节优先", key="-LATEST_FIRST-", enable_events=True, text_color=text_color, background_color=bg_color),
         ],
         [sg.Text("", key="-COMIC_NAME-", visible=False)],
     ]
@@ -118,6 +119,12 @@ def create_main_layout():
             sg.Button("置顶", key="-MOVE_TOP-", disabled=True),
             sg.Button("置底", key="-MOVE_BOTTOM-", disabled=True),
         ],
+        [
+            sg.Button("暂停", key="-PAUSE-", disabled=True),
+            sg.Button("继续", key="-RESUME-", disabled=True),
+            sg.Button("全部暂停", key="-PAUSE_ALL-"),
+            sg.Button("全部继续", key="-RESUME_ALL-", disabled=True),
+        ],
     ]
 
     # 整体布局
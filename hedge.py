@@ -0,0 +1,122 @@
+# hedge.py
+import asyncio
+import collections
+import time
+from utils import (
+    setup_logger, HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY, HEDGE_MAX_EXTRA_RATIO
+)
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 每个主机保留的延迟样本数
+LATENCY_SAMPLES = 200
+# 对冲预算允许累积的额外请求数
+HEDGE_BURST = 5
+
+
+class LatencyTracker:
+    """按主机记录最近的请求延迟"""
+
+    def __init__(self, max_samples=LATENCY_SAMPLES):
+        self.max_samples = max_samples
+        self._samples = {}
+
+    def record(self, key, seconds):
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = collections.deque(maxlen=self.max_samples)
+        samples.append(seconds)
+
+    def percentile(self, key, percentile, min_samples):
+        """样本不足时返回 None"""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """限制对冲产生的额外请求: 每个普通请求积累 ratio 个令牌, 每次对冲消耗 1 个"""
+
+    def __init__(self, ratio=HEDGE_MAX_EXTRA_RATIO, burst=HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+
+    def record_request(self):
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_acquire(self):
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+class Hedger:
+    """对冲请求: 超过该主机 p95 延迟仍未完成时, 发出备用请求, 取先完成的结果并取消另一个"""
+
+    def __init__(self, name, enabled=HEDGE_ENABLED, percentile=HEDGE_PERCENTILE,
+                 min_samples=HEDGE_MIN_SAMPLES, min_delay=HEDGE_MIN_DELAY, max_extra_ratio=HEDGE_MAX_EXTRA_RATIO):
+        self.name = name
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latency = LatencyTracker()
+        self.budget = HedgeBudget(max_extra_ratio)
+        self.hedges_started = 0
+        self.hedges_won = 0
+
+    def hedge_delay(self, key):
+        """返回发出备用请求前的等待时间, 不需要对冲时返回 None"""
+        if not self.enabled:
+            return None
+        delay = self.latency.percentile(key, self.percentile, self.min_samples)
+        if delay is None:
+            return None
+        return max(delay, self.min_delay)
+
+    async def run(self, key, primary, backup=None):
+        """primary / backup 是返回协程的函数, backup 默认与 primary 相同 (即换一个连接重试)"""
+        self.budget.record_request()
+        delay = self.hedge_delay(key)
+        start = time.monotonic()
+        if delay is None:
+            result = await primary()
+        else:
+            result = await self._race(key, primary, backup or primary, delay)
+        self.latency.record(key, time.monotonic() - start)
+        return result
+
+    async def _race(self, key, primary, backup, delay):
+        first = asyncio.create_task(primary())
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done or not self.budget.try_acquire():
+                return await first
+        except BaseException:
+            first.cancel()
+            raise
+
+        self.hedges_started += 1
+        logger.debug(f"[{self.name}] {key} 超过 {delay:.2f}s 未完成, 发出对冲请求")
+        second = asyncio.create_task(backup())
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedges_won += 1
+                        return task.result()
+            # 两个请求都失败, 抛出原始请求的异常
+            return first.result()
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,112 @@
+# link_cache.py
+import json
+import sqlite3
+import threading
+import time
+from utils import setup_logger
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 缓存文件路径
+LINK_CACHE_FILE = "link_cache.db"
+# 已发布章节的图片列表基本不会变化, 缓存时间可以很长 (秒)
+LINK_CACHE_TTL = 30 * 24 * 3600
+# 最多缓存的章节数, 超出时淘汰最久未使用的
+LINK_CACHE_MAX_ENTRIES = 50000
+# 每写入多少次检查一次是否需要淘汰
+EVICT_CHECK_INTERVAL = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_links (
+    chapter_url TEXT PRIMARY KEY,
+    links TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_image_links_accessed ON image_links (accessed);
+"""
+
+
+class LinkCache:
+    """章节 URL -> 有序图片链接列表 的磁盘缓存 (SQLite, TTL + LRU 淘汰), 首次使用时才打开文件"""
+
+    def __init__(self, path=LINK_CACHE_FILE, ttl=LINK_CACHE_TTL, max_entries=LINK_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def get(self, chapter_url):
+        """返回缓存的图片链接, 没有或已过期时返回 None"""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT links, created FROM image_links WHERE chapter_url = ?", (chapter_url,)
+                ).fetchone()
+                if row is None or now - row[1] > self.ttl:
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE image_links SET accessed = ? WHERE chapter_url = ?", (now, chapter_url))
+        except sqlite3.Error as e:
+            logger.error(f"读取图片链接缓存失败: {e}")
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, chapter_url, links):
+        if not links:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO image_links (chapter_url, links, created, accessed) VALUES (?, ?, ?, ?)",
+                    (chapter_url, json.dumps(links), now, now),
+                )
+                self._writes += 1
+                if self._writes % EVICT_CHECK_INTERVAL == 0:
+                    self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.error(f"写入图片链接缓存失败: {e}")
+
+    def invalidate(self, chapter_url):
+        try:
+            with self._lock:
+                self._connection().execute("DELETE FROM image_links WHERE chapter_url = ?", (chapter_url,))
+        except sqlite3.Error as e:
+            logger.error(f"删除图片链接缓存失败: {e}")
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM image_links WHERE created < ?", (now - self.ttl,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM image_links").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM image_links WHERE chapter_url IN "
+                "(SELECT chapter_url FROM image_links ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            logger.debug(f"图片链接缓存淘汰 {count - self.max_entries} 条")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 全局缓存 (模块级别)
+link_cache = LinkCache()
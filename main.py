@@ -2,10 +2,13 @@
 import PySimpleGUI as sg
 from gui import create_main_layout
 from task_manager import TaskManager
-from utils import windows_asyncio_fix, setup_logger, sanitize_filename
+from scheduler import POLICY_FIFO, POLICY_LATEST_FIRST
+from search_service import search_service
+from diagnostics import Diagnostics
+from utils import windows_asyncio_fix, setup_logger, sanitize_filename, format_size, format_duration
 import asyncio
 from downloader import (
-    search_baozimh, get_chapter_list, close_session,
+    close_session,
     get_all_mirrors, add_mirror, set_mirror_source, get_current_mirror, remove_mirror
 )
 import os
@@ -56,11 +59,15 @@ def update_task_lists():
     logger.debug("更新GUI中的任务列表")
     # 使用 downloaded_images 和 total_images 显示进度
     #  显示 "作品名 章节名"
+    progress = task_manager.get_progress()
     downloading_data = [
-        f"{task['comic_name']} {task['chapter_name']} ({task['downloaded_images']}/{task['total_images']})"
-        for task in task_manager.downloading_tasks
+        f"{item['comic_name']} {item['chapter_name']} ({item['downloaded_images']}/{item['total_images']}) "
+        f"{format_size(item['rate'])}/s 剩余 {format_duration(item['eta'])}"
+        for item in progress["downloading"]
     ]
     waiting_data = [f"{task['comic_name']} {task['chapter_name']}" for task in task_manager.waiting_tasks]
+    # 暂停的任务显示在等待列表末尾
+    waiting_data += [f"{task['comic_name']} {task['chapter_name']} (已暂停)" for task in task_manager.paused_tasks]
     completed_data = [f"{task['comic_name']} {task['chapter_name']}" for task in task_manager.completed_tasks]
     error_data = [f"{task['comic_name']} {task['chapter_name']}" for task in task_manager.error_tasks]
 
@@ -68,6 +75,37 @@ def update_task_lists():
     window["-WAITING-"].update(values=waiting_data)
     window["-COMPLETED-"].update(values=completed_data)
     window["-ERROR-"].update(values=error_data)
+    if progress["downloading"]:
+        window["-STATUS-"].update(
+            f"总速度 {format_size(progress['rate'])}/s, 队列剩余 {progress['waiting']} 章, "
+            f"预计 {format_duration(progress['eta'])}"
+        )
+
+def get_selected_task():
+    """返回 正在下载/等待 列表中选中的任务"""
+    selected_index = window["-DOWNLOADING-"].get_indexes()
+    if selected_index and selected_index[0] < len(task_manager.downloading_tasks):
+        return task_manager.downloading_tasks[selected_index[0]]
+    selected_index = window["-WAITING-"].get_indexes()
+    if selected_index:
+        index = selected_index[0]
+        waiting_tasks = task_manager.waiting_tasks
+        if index < len(waiting_tasks):
+            return waiting_tasks[index]
+        index -= len(waiting_tasks)
+        if index < len(task_manager.paused_tasks):
+            return task_manager.paused_tasks[index]
+    return None
+
+def update_task_buttons():
+    """根据选中的任务更新操作按钮状态"""
+    task = get_selected_task()
+    status = task["status"] if task else None
+    window["-CANCEL-"].update(disabled=task is None)
+    window["-PAUSE-"].update(disabled=status not in ("downloading", "waiting"))
+    window["-RESUME-"].update(disabled=status != "paused")
+    for key in ("-MOVE_UP-", "-MOVE_DOWN-", "-MOVE_TOP-", "-MOVE_BOTTOM-"):
+        window[key].update(disabled=status != "waiting")
 
 def show_mirror_selection():
     """显示镜像源选择窗口"""
@@ -138,6 +176,11 @@ def show_add_mirror():
     window.close()
 
 async def main_loop():  # 将主循环改为异步函数
+    # 诊断模式 (环境变量 BAOZIMH_DIAGNOSTICS / BAOZIMH_PROFILE)
+    diagnostics = Diagnostics.from_env()
+    if diagnostics:
+        diagnostics.start()
+
     # 事件循环
     while True:
         event, values = window.read(timeout=100)
@@ -155,14 +198,22 @@ async def main_loop():  # 将主循环改为异步函数
         elif event == "-ADD_MIRROR-":
             show_add_mirror()
 
+        elif event == "-LATEST_FIRST-":
+            task_manager.set_schedule_policy(POLICY_LATEST_FIRST if values["-LATEST_FIRST-"] else POLICY_FIFO)
+
         elif event == "-SEARCH_BTN-":
             keyword = values["-SEARCH-"]
             if keyword:
-                # 使用无 UI 版本的 search_baozimh 函数
-                search_results = search_baozimh(keyword)
-                window["-SEARCH_RESULTS-"].update(
-                    [result["title"] for result in search_results]
-                )
+                # 并行搜索所有镜像, 每个镜像返回后立即刷新结果
+                search_results = []
+                window["-SEARCH_RESULTS-"].update([])
+                window["-STATUS-"].update("正在搜索...")
+                async for batch in search_service.search_stream(keyword):
+                    search_results.extend(batch)
+                    window["-SEARCH_RESULTS-"].update(
+                        [result["title"] for result in search_results]
+                    )
+                    window.refresh()
                 window["-STATUS-"].update(f"搜索到 {len(search_results)} 条结果")
             else:
                 window["-STATUS-"].update("请输入搜索关键词")
@@ -181,8 +232,7 @@ async def main_loop():  # 将主循环改为异步函数
 
         elif event == "-GET_CHAPTERS-":
             if selected_comic:
-                # 使用无 UI 版本的 get_chapter_list 函数
-                chapters = get_chapter_list(selected_comic["url"])
+                chapters = await search_service.get_chapter_list(selected_comic["url"])
                 if chapters:
                     chapter_names = [chapter["name"] for chapter in chapters]
                     window["-CHAPTER_LIST-"].update(chapter_names)
@@ -209,11 +259,8 @@ async def main_loop():  # 将主循环改为异步函数
                 comic_name = sanitize_filename(selected_comic["title"])
                 comic_download_folder = os.path.join("comic", comic_name) # 修改下载路径
                 for chapter in selected_chapters:
-                    # 检查任务是否已经存在(简化)
-                    if not any(existing_task["chapter_url"] == chapter["url"]
-                               for task_list in [task_manager.downloading_tasks, task_manager.waiting_tasks,
-                                                 task_manager.completed_tasks] # 不检查 error_tasks
-                               for existing_task in task_list):
+                    # 检查任务是否已经存在 (不检查 error_tasks)
+                    if not task_manager.has_task(chapter["url"]):
 
                         # 直接调用 task_manager.add_task，不再获取图片链接
                         await task_manager.add_task(
@@ -234,10 +281,7 @@ async def main_loop():  # 将主循环改为异步函数
                 comic_name = sanitize_filename(selected_comic["title"])
                 comic_download_folder = os.path.join("comic", comic_name)  # 修改下载路径
                 for chapter in chapters:
-                    if not any(existing_task["chapter_url"] == chapter["url"]
-                               for task_list in [task_manager.downloading_tasks, task_manager.waiting_tasks,
-                                                 task_manager.completed_tasks] # 不检查 error_tasks
-                               for existing_task in task_list):
+                    if not task_manager.has_task(chapter["url"]): # 不检查 error_tasks
                         await task_manager.add_task(
                             chapter["url"],
                             chapter["name"],
@@ -253,25 +297,16 @@ async def main_loop():  # 将主循环改为异步函数
             window["-WAITING-"].update(set_to_index=[])
             window["-COMPLETED-"].update(set_to_index=[])
             window["-ERROR-"].update(set_to_index=[])
-            # 禁用所有操作按钮
-            window["-CANCEL-"].update(disabled=True)
-            window["-MOVE_UP-"].update(disabled=True)
-            window["-MOVE_DOWN-"].update(disabled=True)
-            window["-MOVE_TOP-"].update(disabled=True)
-            window["-MOVE_BOTTOM-"].update(disabled=True)
+            # 正在下载的任务可以取消和暂停
+            update_task_buttons()
 
         elif event == "-WAITING-":  # 处理等待列表点击事件
             # 清除其他列表的选择
             window["-DOWNLOADING-"].update(set_to_index=[])
             window["-COMPLETED-"].update(set_to_index=[])
             window["-ERROR-"].update(set_to_index=[])
-            selected_index = window["-WAITING-"].get_indexes()
-            # 只有选中等待任务时才启用相关按钮
-            window["-CANCEL-"].update(disabled=not selected_index)
-            window["-MOVE_UP-"].update(disabled=not selected_index)
-            window["-MOVE_DOWN-"].update(disabled=not selected_index)
-            window["-MOVE_TOP-"].update(disabled=not selected_index)
-            window["-MOVE_BOTTOM-"].update(disabled=not selected_index)
+            # 只有选中等待任务时才启用移动按钮, 选中暂停任务时启用继续按钮
+            update_task_buttons()
 
         elif event == "-COMPLETED-":  # 处理完成列表点击事件
             # 清除其他列表的选择
@@ -279,11 +314,7 @@ async def main_loop():  # 将主循环改为异步函数
             window["-WAITING-"].update(set_to_index=[])
             window["-ERROR-"].update(set_to_index=[])
             # 禁用所有操作按钮
-            window["-CANCEL-"].update(disabled=True)
-            window["-MOVE_UP-"].update(disabled=True)
-            window["-MOVE_DOWN-"].update(disabled=True)
-            window["-MOVE_TOP-"].update(disabled=True)
-            window["-MOVE_BOTTOM-"].update(disabled=True)
+            update_task_buttons()
 
         elif event == "-ERROR-":  # 处理错误列表点击事件
             # 清除其他列表的选择
@@ -291,23 +322,42 @@ async def main_loop():  # 将主循环改为异步函数
             window["-WAITING-"].update(set_to_index=[])
             window["-COMPLETED-"].update(set_to_index=[])
             # 禁用所有操作按钮
-            window["-CANCEL-"].update(disabled=True)
-            window["-MOVE_UP-"].update(disabled=True)
-            window["-MOVE_DOWN-"].update(disabled=True)
-            window["-MOVE_TOP-"].update(disabled=True)
-            window["-MOVE_BOTTOM-"].update(disabled=True)
+            update_task_buttons()
 
         elif event == "-CANCEL-":
-            # 只从 waiting_tasks 取消
-            selected_index = window["-WAITING-"].get_indexes()
-            if selected_index:
-                task_to_cancel = task_manager.waiting_tasks[selected_index[0]]
+            # 正在下载的任务会立即中断
+            task_to_cancel = get_selected_task()
+            if task_to_cancel:
                 await task_manager.cancel_task(task_to_cancel)
+            update_task_buttons()
+
+        elif event == "-PAUSE-":
+            task_to_pause = get_selected_task()
+            if task_to_pause:
+                await task_manager.pause_task(task_to_pause)
+            update_task_buttons()
+
+        elif event == "-RESUME-":
+            task_to_resume = get_selected_task()
+            if task_to_resume:
+                await task_manager.resume_task(task_to_resume)
+            update_task_buttons()
+
+        elif event == "-PAUSE_ALL-":
+            await task_manager.pause_all()
+            window["-PAUSE_ALL-"].update(disabled=True)
+            window["-RESUME_ALL-"].update(disabled=False)
+            window["-STATUS-"].update("已全部暂停")
+
+        elif event == "-RESUME_ALL-":
+            await task_manager.resume_all()
+            window["-PAUSE_ALL-"].update(disabled=False)
+            window["-RESUME_ALL-"].update(disabled=True)
+            window["-STATUS-"].update("已全部继续")
 
         elif event.startswith("-MOVE_"):
-            selected_index = window["-WAITING-"].get_indexes()
-            if selected_index:
-                task_to_move = task_manager.waiting_tasks[selected_index[0]]
+            task_to_move = get_selected_task()
+            if task_to_move and task_to_move["status"] == "waiting":
                 if event == "-MOVE_UP-":
                     task_manager.move_task(task_to_move, "up")
                 elif event == "-MOVE_DOWN-":
@@ -318,14 +368,7 @@ async def main_loop():  # 将主循环改为异步函数
                     task_manager.move_task(task_to_move, "bottom")
 
             # 简化按钮状态更新逻辑
-            waiting_selected = len(window["-WAITING-"].get_indexes()) > 0
-            downloading_selected = len(window["-DOWNLOADING-"].get_indexes()) > 0
-
-            window["-CANCEL-"].update(disabled=not (waiting_selected or downloading_selected))
-            window["-MOVE_UP-"].update(disabled=not waiting_selected)
-            window["-MOVE_DOWN-"].update(disabled=not waiting_selected)
-            window["-MOVE_TOP-"].update(disabled=not waiting_selected)
-            window["-MOVE_BOTTOM-"].update(disabled=not waiting_selected)
+            update_task_buttons()
 
 
         elif event == "-UPDATE_LISTS-":
@@ -335,6 +378,8 @@ async def main_loop():  # 将主循环改为异步函数
 
     window.close()
     await task_manager.close()  # 在程序退出时保存进度
+    if diagnostics:
+        diagnostics.stop()
 
 asyncio.run(main_loop())
 
@@ -0,0 +1,132 @@
+# manifest.py
+import argparse
+import asyncio
+import json
+import os
+from search_service import search_service
+from task_manager import TaskManager
+from utils import windows_asyncio_fix, setup_logger, sanitize_filename
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 同时解析的漫画数量
+MANIFEST_CONCURRENCY = 4
+# 等待队列中的章节超过该数量时暂停解析, 让内存占用与清单大小无关
+MANIFEST_HIGH_WATER = 500
+# 暂停解析时检查等待队列的间隔 (秒)
+BACKPRESSURE_POLL_INTERVAL = 0.5
+
+
+def iter_manifest(path):
+    """逐行读取 JSONL 清单, 每行是 {"url": ...} 或 {"search": ...}, 可选 "name" """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # 也接受每行一个纯文本的 URL 或关键词
+                entry = {"url": line} if line.startswith(("http://", "https://")) else {"search": line}
+            if isinstance(entry, str):
+                entry = {"url": entry} if entry.startswith(("http://", "https://")) else {"search": entry}
+            if not isinstance(entry, dict) or not (entry.get("url") or entry.get("search")):
+                logger.warning(f"清单第 {line_no} 行无效, 跳过: {line}")
+                continue
+            entry["line"] = line_no
+            yield entry
+
+
+async def resolve_entry(entry):
+    """把清单条目解析成 (漫画名, 章节列表)"""
+    comic_url = entry.get("url")
+    comic_name = entry.get("name")
+    if not comic_url:
+        results = await search_service.search(entry["search"])
+        if not results:
+            raise LookupError(f"没有搜索到漫画: {entry['search']}")
+        comic_url = results[0]["url"]
+        comic_name = comic_name or results[0]["title"]
+    if not comic_name:
+        comic_name = comic_url.rstrip("/").rsplit("/", 1)[-1]
+    chapters = await search_service.get_chapter_list(comic_url)
+    return comic_name, chapters
+
+
+async def import_manifest(path, task_manager, concurrency=MANIFEST_CONCURRENCY, high_water=MANIFEST_HIGH_WATER):
+    """流式导入清单: 有界并发解析漫画, 每解析完一部就把章节加入 TaskManager
+
+    等待队列中的章节超过 high_water 时, 解析暂停, 直到下载消化掉一部分
+    """
+    queue = asyncio.Queue(maxsize=concurrency * 2)  # 有界队列, 内存占用与清单大小无关
+    stats = {"comics": 0, "chapters": 0, "failed": 0}
+
+    async def producer():
+        for entry in iter_manifest(path):
+            await queue.put(entry)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def resolver():
+        while True:
+            while len(task_manager.scheduler) > high_water:
+                await asyncio.sleep(BACKPRESSURE_POLL_INTERVAL)
+            entry = await queue.get()
+            if entry is None:
+                return
+            try:
+                comic_name, chapters = await resolve_entry(entry)
+                if not chapters:
+                    raise LookupError("章节列表为空")
+            except Exception as e:
+                stats["failed"] += 1
+                logger.error(f"清单第 {entry['line']} 行解析失败: {e}")
+                continue
+
+            comic_name = sanitize_filename(comic_name)
+            comic_download_folder = os.path.join("comic", comic_name)
+            for chapter in chapters:
+                await task_manager.add_task(
+                    chapter["url"],
+                    chapter["name"],
+                    comic_download_folder,
+                    0,  # total_images
+                    [],  # img_links
+                    comic_name
+                )
+            stats["comics"] += 1
+            stats["chapters"] += len(chapters)
+            logger.info(f"清单第 {entry['line']} 行: {comic_name}, 加入 {len(chapters)} 个章节")
+
+    await asyncio.gather(producer(), *(resolver() for _ in range(concurrency)))
+    logger.info(f"清单导入完成: {stats}")
+    return stats
+
+
+async def run_manifest(path, concurrency=MANIFEST_CONCURRENCY):
+    task_manager = TaskManager()
+    try:
+        stats = await import_manifest(path, task_manager, concurrency)
+        await task_manager.wait_until_idle()
+    finally:
+        await task_manager.close()
+    stats["completed"] = task_manager.completed_tasks.total
+    stats["errors"] = task_manager.error_tasks.total
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从 JSONL 清单批量下载漫画")
+    parser.add_argument("manifest", help="清单文件, 每行一个 {\"url\": ...} 或 {\"search\": ...}")
+    parser.add_argument("--concurrency", type=int, default=MANIFEST_CONCURRENCY, help="同时解析的漫画数量")
+    args = parser.parse_args()
+
+    windows_asyncio_fix()
+    stats = asyncio.run(run_manifest(args.manifest, max(1, args.concurrency)))
+    print(json.dumps(stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# progress.py
+import time
+
+RATE_WINDOW = 10  # 速率统计窗口 (秒)
+RATE_RESOLUTION = 0.5  # 时间桶大小 (秒)
+
+
+class RateMeter:
+    """滑动窗口速率统计 (固定数量的时间桶, 记录和查询都很便宜)"""
+
+    __slots__ = ("resolution", "_buckets", "_bucket_ids", "_started")
+
+    def __init__(self, window=RATE_WINDOW, resolution=RATE_RESOLUTION):
+        count = max(1, int(window / resolution))
+        self.resolution = resolution
+        self._buckets = [0] * count
+        self._bucket_ids = [-1] * count
+        self._started = None
+
+    def add(self, amount, now=None):
+        now = time.monotonic() if now is None else now
+        if self._started is None:
+            self._started = now
+        bucket_id = int(now / self.resolution)
+        index = bucket_id % len(self._buckets)
+        if self._bucket_ids[index] != bucket_id:
+            self._bucket_ids[index] = bucket_id
+            self._buckets[index] = 0
+        self._buckets[index] += amount
+
+    def rate(self, now=None):
+        """窗口内的平均速率 (每秒)"""
+        if self._started is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        current = int(now / self.resolution)
+        oldest = current - len(self._buckets) + 1
+        total = sum(
+            amount for bucket_id, amount in zip(self._bucket_ids, self._buckets)
+            if oldest <= bucket_id <= current
+        )
+        window = len(self._buckets) * self.resolution
+        elapsed = min(window, max(now - self._started, self.resolution))
+        return total / elapsed
+
+
+class TransferStats:
+    """全局和每个任务的传输速率, 以及剩余时间估计"""
+
+    def __init__(self):
+        self.total = RateMeter()
+        self._task_meters = {}  # chapter_url -> RateMeter
+        self.bytes_downloaded = 0  # 已完成图片的总大小
+        self.images_downloaded = 0  # 实际下载 (非跳过) 的图片数
+        self.chapters_finished = 0
+        self.images_in_finished_chapters = 0
+
+    @property
+    def average_image_size(self):
+        if not self.images_downloaded:
+            return 0
+        return self.bytes_downloaded / self.images_downloaded
+
+    @property
+    def average_chapter_images(self):
+        if not self.chapters_finished:
+            return 0
+        return self.images_in_finished_chapters / self.chapters_finished
+
+    def on_transfer(self, task, nbytes, image_size=None):
+        """nbytes: 新收到的字节数, 负数表示撤回失败请求的字节; image_size: 一张图片下载完成时传入它的大小"""
+        if nbytes < 0:
+            # 失败/落败的请求: 字节确实传输过, 速率不变, 只从章节的已下载大小中扣除
+            task["downloaded_size"] = max(0, task["downloaded_size"] + nbytes)
+        elif nbytes:
+            now = time.monotonic()
+            meter = self._task_meters.get(task["chapter_url"])
+            if meter is None:
+                meter = self._task_meters[task["chapter_url"]] = RateMeter()
+            meter.add(nbytes, now)
+            self.total.add(nbytes, now)
+            task["downloaded_size"] += nbytes
+        if image_size is not None:
+            self.images_downloaded += 1
+            self.bytes_downloaded += image_size
+        task["total_size"] = int(task["downloaded_size"] + self.task_remaining_bytes(task))
+
+    def on_task_finished(self, task):
+        self._task_meters.pop(task["chapter_url"], None)
+        if task["status"] == "completed":
+            self.chapters_finished += 1
+            self.images_in_finished_chapters += task["total_images"]
+
+    def task_rate(self, task):
+        meter = self._task_meters.get(task["chapter_url"])
+        return meter.rate() if meter else 0.0
+
+    def task_remaining_bytes(self, task):
+        remaining = max(0, task["total_images"] - task["downloaded_images"])
+        return remaining * self.average_image_size
+
+    def task_eta(self, task):
+        """当前章节的剩余时间 (秒), 无法估计时返回 None"""
+        rate = self.task_rate(task)
+        if rate <= 0 or not self.average_image_size:
+            return None
+        return self.task_remaining_bytes(task) / rate
+
+    def queue_eta(self, downloading_tasks, waiting_count):
+        """整个队列的剩余时间 (秒), 无法估计时返回 None"""
+        rate = self.total.rate()
+        if rate <= 0 or not self.average_image_size:
+            return None
+        remaining = sum(self.task_remaining_bytes(task) for task in downloading_tasks)
+        chapter_images = self.average_chapter_images or max(
+            (task["total_images"] for task in downloading_tasks), default=0)
+        remaining += waiting_count * chapter_images * self.average_image_size
+        return remaining / rate
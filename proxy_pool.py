@@ -0,0 +1,186 @@
+# proxy_pool.py
+import asyncio
+import json
+import os
+import random
+from urllib.parse import urlsplit
+import aiohttp
+from utils import setup_logger, PROXY_EJECT_FAILURES, PROXY_PROBE_INTERVAL, PROXY_PROBE_MAX_INTERVAL
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 代理配置文件路径
+PROXIES_CONFIG_FILE = "proxies.json"
+# 吞吐量和错误率的指数平滑系数
+THROUGHPUT_ALPHA = 0.3
+ERROR_ALPHA = 0.2
+# 错误率对权重的最低保留比例, 避免偶尔出错的代理完全拿不到请求
+MIN_HEALTH = 0.05
+# 这些状态码通常表示出口 IP 被限流, 计入代理的失败
+THROTTLE_STATUSES = (403, 429)
+
+
+class Proxy:
+    """单个出口 (代理或直连) 的健康状态, url 为 None 表示直连"""
+
+    def __init__(self, url, name=None):
+        self.url = url
+        self.name = name or (urlsplit(url).netloc if url else "直连")
+        self.session = None  # 由 SessionManager 创建, 每个出口独立的连接池
+        self.throughput = None  # 平滑后的吞吐量 (字节/秒)
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected = False
+        self.requests = 0
+        self.failures = 0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "url": self.url,
+            "throughput": round(self.throughput or 0.0, 1),
+            "error_rate": round(self.error_rate, 3),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.ejected,
+        }
+
+
+def load_proxies(path=PROXIES_CONFIG_FILE):
+    """读取代理配置, 格式: {"proxies": ["http://host:port", {"url": "socks5://...", "name": "..."}], "include_direct": false}"""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except Exception as e:
+        logger.error(f"加载代理配置失败: {e}")
+        return []
+
+    proxies = []
+    for entry in config.get("proxies", []):
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        url = entry.get("url")
+        if not url:
+            continue
+        proxies.append(Proxy(url, entry.get("name")))
+    if proxies and config.get("include_direct"):
+        proxies.append(Proxy(None))
+    return proxies
+
+
+class ProxyPool:
+    """图片请求的出口代理池: 按吞吐量和错误率加权分配, 连续失败的代理被移出, 之后在后台重新探测"""
+
+    def __init__(self, proxies=None, eject_failures=PROXY_EJECT_FAILURES, probe_interval=PROXY_PROBE_INTERVAL,
+                 probe_max_interval=PROXY_PROBE_MAX_INTERVAL):
+        self.proxies = load_proxies() if proxies is None else list(proxies)
+        self.eject_failures = eject_failures
+        self.probe_interval = probe_interval
+        self.probe_max_interval = probe_max_interval
+        self.probe_url = None  # 最近一次成功请求的主机, 用来探测被移出的代理
+        self._probe_tasks = set()
+        if self.proxies:
+            logger.info(f"已加载 {len(self.proxies)} 个出口: {', '.join(proxy.name for proxy in self.proxies)}")
+
+    @property
+    def enabled(self):
+        return bool(self.proxies)
+
+    def _weight(self, proxy, default_throughput):
+        throughput = proxy.throughput if proxy.throughput is not None else default_throughput
+        return throughput * max(MIN_HEALTH, 1.0 - proxy.error_rate) / (1 + proxy.in_flight)
+
+    def choose(self):
+        """按权重随机选择一个可用出口, 没有配置代理时返回 None"""
+        if not self.proxies:
+            return None
+        healthy = [proxy for proxy in self.proxies if not proxy.ejected]
+        if not healthy:
+            # 全部被移出时使用移出次数最少的, 不退回到可能被限流的直连
+            return min(self.proxies, key=lambda proxy: proxy.ejections)
+        measured = [proxy.throughput for proxy in healthy if proxy.throughput is not None]
+        # 还没有数据的代理按平均吞吐量对待, 让它尽快拿到样本
+        default_throughput = sum(measured) / len(measured) if measured else 1.0
+        weights = [self._weight(proxy, default_throughput) for proxy in healthy]
+        return random.choices(healthy, weights=weights)[0]
+
+    def record_success(self, proxy, nbytes, seconds, url=None):
+        proxy.requests += 1
+        proxy.consecutive_failures = 0
+        proxy.error_rate *= 1 - ERROR_ALPHA
+        if nbytes and seconds > 0:
+            sample = nbytes / seconds
+            if proxy.throughput is None:
+                proxy.throughput = sample
+            else:
+                proxy.throughput += THROUGHPUT_ALPHA * (sample - proxy.throughput)
+        if url:
+            parts = urlsplit(url)
+            self.probe_url = f"{parts.scheme}://{parts.netloc}/"
+
+    def record_failure(self, proxy, error=None):
+        proxy.requests += 1
+        proxy.failures += 1
+        proxy.consecutive_failures += 1
+        proxy.error_rate += ERROR_ALPHA * (1.0 - proxy.error_rate)
+        if not proxy.ejected and proxy.consecutive_failures >= self.eject_failures:
+            self._eject(proxy, error)
+
+    @staticmethod
+    def is_proxy_failure(error):
+        """区分出口问题和资源本身的问题 (例如 404 不应算到代理头上)"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in THROTTLE_STATUSES or error.status >= 500
+        return True
+
+    def _eject(self, proxy, error):
+        proxy.ejected = True
+        proxy.ejections += 1
+        logger.warning(f"出口 {proxy.name} 连续失败 {proxy.consecutive_failures} 次, 暂时移出: {error}")
+        try:
+            task = asyncio.get_running_loop().create_task(self._probe_until_healthy(proxy))
+        except RuntimeError:
+            return
+        self._probe_tasks.add(task)
+        task.add_done_callback(self._probe_tasks.discard)
+
+    async def _probe_until_healthy(self, proxy):
+        delay = min(self.probe_max_interval, self.probe_interval * 2 ** (proxy.ejections - 1))
+        while proxy.ejected:
+            await asyncio.sleep(delay)
+            if await self._probe(proxy):
+                proxy.ejected = False
+                proxy.consecutive_failures = 0
+                proxy.error_rate = 0.5  # 先按半健康对待, 由后续请求决定权重
+                logger.info(f"出口 {proxy.name} 探测成功, 重新加入")
+                return
+            delay = min(self.probe_max_interval, delay * 2)
+
+    async def _probe(self, proxy):
+        session = proxy.session
+        if session is None or session.closed or not self.probe_url:
+            return False
+        try:
+            async with session.head(self.probe_url, allow_redirects=False,
+                                    timeout=aiohttp.ClientTimeout(total=10)) as response:
+                return response.status not in THROTTLE_STATUSES and response.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.debug(f"探测出口 {proxy.name} 失败: {e}")
+            return False
+
+    def stats(self):
+        return [proxy.to_dict() for proxy in self.proxies]
+
+    async def close(self):
+        for task in list(self._probe_tasks):
+            task.cancel()
+        for proxy in self.proxies:
+            if proxy.session and not proxy.session.closed:
+                await proxy.session.close()
+            proxy.session = None
@@ -0,0 +1,226 @@
+# repair.py
+import asyncio
+import os
+from downloader import download_image, read_chapter_metadata, image_file_name, CHAPTER_METADATA_FILE
+from search_service import search_service, comic_slug
+from utils import setup_logger, sanitize_filename
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 补全时全局同时下载的图片数
+REPAIR_CONCURRENCY = 8
+# 没有章节信息时, 同时解析的漫画数
+RESOLVE_CONCURRENCY = 4
+
+
+class ChapterState:
+    """一个章节文件夹的检查结果"""
+
+    __slots__ = ("folder", "chapter_url", "img_links", "missing", "present_bytes")
+
+    def __init__(self, folder, chapter_url, img_links, missing, present_bytes):
+        self.folder = folder
+        self.chapter_url = chapter_url
+        self.img_links = img_links
+        self.missing = missing  # 缺失图片的序号 (从 0 开始)
+        self.present_bytes = present_bytes
+
+
+def inspect_chapter(folder):
+    """对比 .chapter.json 中的图片列表和磁盘上的文件, 没有章节信息时返回 None"""
+    metadata = read_chapter_metadata(folder)
+    if metadata is None:
+        return None
+    img_links = metadata["images"]
+    missing = []
+    present_bytes = 0
+    for i in range(len(img_links)):
+        try:
+            size = os.path.getsize(image_file_name(folder, i))
+        except OSError:
+            size = 0
+        if size:
+            present_bytes += size
+        else:
+            missing.append(i)
+    return ChapterState(folder, metadata.get("chapter_url"), img_links, missing, present_bytes)
+
+
+def scan_library(root="comic"):
+    """遍历 root/<漫画>/<章节>, 返回 (章节检查结果列表, 没有章节信息的文件夹列表)"""
+    chapters = []
+    unknown = []
+    if not os.path.isdir(root):
+        return chapters, unknown
+    for comic_entry in sorted(os.scandir(root), key=lambda entry: entry.name):
+        if not comic_entry.is_dir():
+            continue
+        for chapter_entry in sorted(os.scandir(comic_entry.path), key=lambda entry: entry.name):
+            if not chapter_entry.is_dir():
+                continue
+            state = inspect_chapter(chapter_entry.path)
+            if state is None:
+                unknown.append(chapter_entry.path)
+            else:
+                chapters.append(state)
+    return chapters, unknown
+
+
+async def find_comic_url(comic_name):
+    """按文件夹名 (清理后的漫画名) 搜索漫画, 只接受标题或 URL 最后一段完全一致的结果"""
+    for result in await search_service.search(comic_name):
+        if comic_name in (sanitize_filename(result["title"]), comic_slug(result["url"])):
+            return result["url"]
+    return None
+
+
+async def resolve_comic_folders(comic_folder, folders):
+    """为没有 .chapter.json 的章节文件夹找到对应的章节: 每部漫画获取一次章节列表,
+    按 sanitize_filename(章节名) 匹配文件夹
+
+    旧版本下载的图片序号和页码不一定对应, 不能按序号补全, 这些章节只记录下来, 需要完整重新下载。
+    返回 (需要重新下载的章节列表, 无法解析的文件夹列表)
+    """
+    comic_name = os.path.basename(comic_folder)
+    try:
+        comic_url = await find_comic_url(comic_name)
+        chapters = await search_service.get_chapter_list(comic_url) if comic_url else []
+    except Exception as e:
+        logger.error(f"解析漫画失败: {comic_name}, 错误: {e}")
+        chapters = []
+    if not chapters:
+        logger.warning(f"找不到漫画或章节列表: {comic_name}")
+        return [], folders
+
+    by_folder = {sanitize_filename(chapter["name"]): (i, chapter) for i, chapter in enumerate(chapters)}
+    redownload = []
+    unresolved = []
+    for folder in folders:
+        match = by_folder.get(os.path.basename(folder))
+        if match is None:
+            logger.warning(f"章节列表中没有对应的章节: {folder}")
+            unresolved.append(folder)
+            continue
+        i, chapter = match
+        # chapter 是从 1 开始的章节序号, 可以直接用于 download --chapters
+        redownload.append({"folder": folder, "comic_url": comic_url, "chapter": i + 1, "chapter_url": chapter["url"]})
+    return redownload, unresolved
+
+
+async def resolve_unknown_folders(unknown, concurrency=RESOLVE_CONCURRENCY):
+    by_comic = {}
+    for folder in unknown:
+        by_comic.setdefault(os.path.dirname(folder), []).append(folder)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(comic_folder, folders):
+        async with semaphore:
+            return await resolve_comic_folders(comic_folder, folders)
+
+    redownload = []
+    unresolved = []
+    for chapters, failed in await asyncio.gather(*(resolve(*item) for item in by_comic.items())):
+        redownload.extend(chapters)
+        unresolved.extend(failed)
+    return sorted(redownload, key=lambda item: item["folder"]), sorted(unresolved)
+
+
+def interleave(chapters):
+    """按漫画轮流取缺失的图片, 让全局下载池同时覆盖所有漫画"""
+    by_comic = {}
+    for state in chapters:
+        if state.missing:
+            comic = os.path.dirname(state.folder)
+            by_comic.setdefault(comic, []).extend((state, i) for i in state.missing)
+    queues = [iter(items) for items in by_comic.values()]
+    while queues:
+        remaining = []
+        for queue in queues:
+            item = next(queue, None)
+            if item is not None:
+                yield item
+                remaining.append(queue)
+        queues = remaining
+
+
+async def repair_library(root="comic", concurrency=REPAIR_CONCURRENCY, dry_run=False, progress_callback=None):
+    """只下载缺失的图片 (所有漫画共用一个下载池), 返回统计信息
+
+    没有 .chapter.json 的文件夹 (旧版本下载的章节) 无法确定图片和页码的对应关系, 不做补全:
+    能在章节列表中找到的记录在 stats["needs_redownload"] 中 (需要完整重新下载),
+    找不到的记录在 stats["unresolved_folders"] 中。
+    progress_callback(stats) 在每张图片结束时调用
+    """
+    chapters, unknown = await asyncio.to_thread(scan_library, root)
+    stats = {
+        "unknown_folders": len(unknown),
+        "needs_redownload": [],
+        "unresolved_folders": [],
+        # 完整重新下载需要为每个章节请求一次网页, 有章节信息的章节不需要
+        "html_requests_saved": len(chapters),
+    }
+    if unknown:
+        logger.info(f"{len(unknown)} 个文件夹没有 {CHAPTER_METADATA_FILE}, 按章节列表查找对应的章节")
+        redownload, unresolved = await resolve_unknown_folders(unknown)
+        stats["needs_redownload"] = redownload
+        stats["unresolved_folders"] = unresolved
+        for item in redownload:
+            logger.warning(f"需要完整重新下载: {item['folder']} ({item['chapter_url']})")
+        for folder in unresolved:
+            logger.warning(f"无法确定对应的章节: {folder}")
+    stats.update({
+        "chapters": len(chapters),
+        "incomplete_chapters": sum(1 for state in chapters if state.missing),
+        "images": sum(len(state.img_links) for state in chapters),
+        "missing_images": sum(len(state.missing) for state in chapters),
+        "repaired_images": 0,
+        "failed_images": 0,
+        "present_bytes": sum(state.present_bytes for state in chapters),
+        "downloaded_bytes": 0,
+    })
+    logger.info(f"检查完成: {stats}")
+    if dry_run or not stats["missing_images"]:
+        return finish_stats(stats)
+
+    pending = interleave(chapters)
+    failed_chapters = set()
+
+    async def worker():
+        for state, i in pending:
+            file_name = image_file_name(state.folder, i)
+            if os.path.exists(file_name):
+                os.remove(file_name)  # 空文件 (写入中断) 需要重新下载
+            succeeded = []
+            await download_image(
+                state.img_links[i], state.folder, i,
+                progress_callback=lambda downloaded, total: succeeded.append(bool(downloaded)),
+                chapter_url=state.chapter_url,
+            )
+            if succeeded and succeeded[-1]:
+                stats["repaired_images"] += 1
+                stats["downloaded_bytes"] += os.path.getsize(file_name)
+            else:
+                stats["failed_images"] += 1
+                failed_chapters.add(state.folder)
+            if progress_callback:
+                progress_callback(stats)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, stats["missing_images"])))))
+    stats["failed_chapters"] = sorted(failed_chapters)
+    logger.info(f"补全完成: {stats}")
+    return finish_stats(stats)
+
+
+def finish_stats(stats):
+    """节省的流量: 和完整重新下载相比不需要传输的图片字节数 (只统计时按已有图片的平均大小估计缺失部分)"""
+    missing_bytes = stats["downloaded_bytes"]
+    if not missing_bytes and stats["missing_images"]:
+        present_images = stats["images"] - stats["missing_images"]
+        if present_images:
+            missing_bytes = stats["present_bytes"] // present_images * stats["missing_images"]
+        stats["estimated_missing_bytes"] = missing_bytes
+    full_bytes = stats["present_bytes"] + missing_bytes
+    stats["saved_bytes"] = stats["present_bytes"]
+    stats["saved_ratio"] = round(stats["present_bytes"] / full_bytes, 4) if full_bytes else 0.0
+    return stats
@@ -0,0 +1,234 @@
+# scheduler.py
+import heapq
+import itertools
+from utils import setup_logger
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 同一部漫画内的排序策略
+POLICY_FIFO = "fifo"  # 先加入的章节先下载
+POLICY_LATEST_FIRST = "latest_first"  # 后加入的 (最新) 章节先下载
+SCHEDULE_POLICIES = (POLICY_FIFO, POLICY_LATEST_FIRST)
+
+# entry 字段下标: [负优先级, 组内排序键, 序号, task, 是否有效]
+_PRIO, _ORDER, _SEQ, _TASK, _ALIVE = range(5)
+
+
+class _Group:
+    __slots__ = ("key", "heap", "count", "served", "order", "version")
+
+    def __init__(self, key, order):
+        self.key = key
+        self.heap = []  # 组内的 entry 堆
+        self.count = 0  # 有效 entry 数量
+        self.served = 0  # 上次被调度的时刻, 越小越先轮到
+        self.order = order  # 创建顺序, 用于打破平局
+        self.version = 0  # 对应全局堆中唯一有效的记录
+
+
+class TaskScheduler:
+    """等待队列调度器: 优先级 + 按漫画轮转的公平调度, 入队/出队都是 O(log n)"""
+
+    def __init__(self, policy=POLICY_FIFO, fair_share=True):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"未知的调度策略: {policy}")
+        self.policy = policy
+        self.fair_share = fair_share
+        self._groups = {}
+        self._served = {}  # 已清空的组 -> 上次被调度的时刻, 组重新出现时沿用, 不会插到其他漫画前面
+        self._group_heap = []  # (组头负优先级, served, order, version, key), 过期记录延迟丢弃
+        self._entries = {}  # chapter_url -> entry
+        self._seq = itertools.count()
+        self._versions = itertools.count(1)
+        self._tick = 0
+        self._change = 0  # 每次修改递增, 用于缓存有序快照
+        self._snapshot = []
+        self._snapshot_change = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def __contains__(self, task):
+        entry = self._entries.get(task["chapter_url"])
+        return entry is not None and entry[_TASK] is task
+
+    def __iter__(self):
+        return iter(self.ordered())
+
+    def find(self, chapter_url):
+        """按章节 URL 查找等待中的任务"""
+        entry = self._entries.get(chapter_url)
+        return entry[_TASK] if entry else None
+
+    def _group_key(self, task):
+        if not self.fair_share:
+            return None
+        return task.get("submitter") or task["comic_name"]
+
+    def _order_key(self, seq):
+        return -seq if self.policy == POLICY_LATEST_FIRST else seq
+
+    def _push_group(self, group):
+        group.version = next(self._versions)
+        heapq.heappush(self._group_heap, (group.heap[0][_PRIO], group.served, group.order, group.version, group.key))
+
+    @staticmethod
+    def _clean(group):
+        while group.heap and not group.heap[0][_ALIVE]:
+            heapq.heappop(group.heap)
+
+    def _remove_group(self, group):
+        del self._groups[group.key]
+        if group.served:
+            self._served[group.key] = group.served
+
+    def _insert(self, entry):
+        task = entry[_TASK]
+        key = self._group_key(task)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Group(key, next(self._versions))
+            group.served = self._served.pop(key, 0)
+        heapq.heappush(group.heap, entry)
+        group.count += 1
+        if group.heap[0] is entry:
+            self._push_group(group)
+        self._entries[task["chapter_url"]] = entry
+        self._change += 1
+
+    def _discard(self, entry):
+        task = entry[_TASK]
+        entry[_ALIVE] = False
+        del self._entries[task["chapter_url"]]
+        key = self._group_key(task)
+        group = self._groups[key]
+        group.count -= 1
+        was_head = group.heap[0] is entry
+        self._clean(group)
+        if not group.count:
+            self._remove_group(group)
+        elif was_head:
+            self._push_group(group)
+        self._change += 1
+
+    def push(self, task, priority=0):
+        """加入任务, priority 越大越先下载"""
+        seq = next(self._seq)
+        self._insert([-priority, self._order_key(seq), seq, task, True])
+
+    def pop(self):
+        """取出下一个要下载的任务, 队列为空时返回 None"""
+        while self._group_heap:
+            _, _, _, version, key = heapq.heappop(self._group_heap)
+            group = self._groups.get(key)
+            if group is None or group.version != version:
+                continue  # 过期记录
+            entry = heapq.heappop(group.heap)
+            entry[_ALIVE] = False
+            del self._entries[entry[_TASK]["chapter_url"]]
+            group.count -= 1
+            self._tick += 1
+            group.served = self._tick
+            self._clean(group)
+            if group.count:
+                self._push_group(group)
+            else:
+                self._remove_group(group)
+            self._change += 1
+            return entry[_TASK]
+        return None
+
+    def remove(self, task):
+        """移除等待中的任务, 返回是否移除成功"""
+        entry = self._entries.get(task["chapter_url"])
+        if entry is None or entry[_TASK] is not task:
+            return False
+        self._discard(entry)
+        return True
+
+    def _rekey(self, entry, neg_priority, order_key):
+        self._discard(entry)
+        self._insert([neg_priority, order_key, entry[_SEQ], entry[_TASK], True])
+
+    def set_priority(self, task, priority):
+        entry = self._entries.get(task["chapter_url"])
+        if entry is not None and entry[_TASK] is task:
+            self._rekey(entry, -priority, entry[_ORDER])
+
+    def get_priority(self, task):
+        entry = self._entries.get(task["chapter_url"])
+        return -entry[_PRIO] if entry else None
+
+    def ordered(self):
+        """按实际出队顺序排列的任务列表 (有缓存, 只在队列变化后重新计算)"""
+        if self._snapshot_change == self._change:
+            return self._snapshot
+        # 在副本上模拟 pop 的过程
+        queues = {}
+        heap = []
+        for key, group in self._groups.items():
+            entries = sorted(e for e in group.heap if e[_ALIVE])
+            queues[key] = entries
+            heap.append((entries[0][_PRIO], group.served, group.order, 0, key))
+        heapq.heapify(heap)
+        positions = dict.fromkeys(queues, 0)
+        tick = self._tick
+        result = []
+        while heap:
+            _, _, order, _, key = heapq.heappop(heap)
+            entries = queues[key]
+            index = positions[key]
+            result.append(entries[index][_TASK])
+            tick += 1
+            index += 1
+            positions[key] = index
+            if index < len(entries):
+                heapq.heappush(heap, (entries[index][_PRIO], tick, order, 0, key))
+        self._snapshot = result
+        self._snapshot_change = self._change
+        return result
+
+    def move(self, task, direction):
+        """按显示顺序移动任务: up / down / top / bottom"""
+        order = self.ordered()
+        entry = self._entries.get(task["chapter_url"])
+        if entry is None or entry[_TASK] is not task:
+            return False
+        index = order.index(task)
+        if direction == "top":
+            if index > 0:
+                first = self._entries[order[0]["chapter_url"]]
+                self._rekey(entry, first[_PRIO] - 1, entry[_ORDER])
+        elif direction == "bottom":
+            if index < len(order) - 1:
+                last = self._entries[order[-1]["chapter_url"]]
+                self._rekey(entry, last[_PRIO] + 1, entry[_ORDER])
+        elif direction in ("up", "down"):
+            step = -1 if direction == "up" else 1
+            neighbor_index = index + step
+            if not 0 <= neighbor_index < len(order):
+                return False
+            # 公平调度下各漫画轮流出队, 所以上移/下移是和同一部漫画里相邻的章节交换位置
+            key = self._group_key(task)
+            other = None
+            for i in range(neighbor_index, -1 if step < 0 else len(order), step):
+                if self._group_key(order[i]) == key:
+                    other = self._entries[order[i]["chapter_url"]]
+                    break
+            if other is not None:
+                prio, order_key = entry[_PRIO], entry[_ORDER]
+                self._rekey(entry, other[_PRIO], other[_ORDER])
+                self._rekey(other, prio, order_key)
+            else:
+                # 同一部漫画里已经是第一个/最后一个, 只能跨过相邻任务的优先级
+                neighbor = self._entries[order[neighbor_index]["chapter_url"]]
+                if neighbor[_PRIO] == entry[_PRIO]:
+                    return False
+                self._rekey(entry, neighbor[_PRIO] + step, entry[_ORDER])
+        else:
+            return False
+        return True
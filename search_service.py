@@ -0,0 +1,143 @@
+# search_service.py
+import asyncio
+import time
+from urllib.parse import urlencode, urlsplit
+from downloader import fetch, get_all_mirrors, parse_search_results, parse_chapter_list
+from utils import setup_logger, TTLCache, SingleFlight
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+SEARCH_CACHE_SIZE = 256  # 缓存的搜索关键词数量
+SEARCH_CACHE_TTL = 600  # 搜索结果缓存时间 (秒)
+COMIC_CACHE_SIZE = 256  # 缓存的漫画详情页数量
+COMIC_CACHE_TTL = 600  # 章节列表缓存时间 (秒)
+MIRROR_TIMEOUT = 10  # 单个镜像搜索的连接/读取超时 (秒), 不包括等待连接池的时间
+MIRROR_FAILURE_COOLDOWN = 300  # 镜像出错后暂停使用的时间 (秒)
+
+
+def comic_slug(comic_url):
+    """漫画 URL 的最后一段 (各镜像之间相同), 用于去重"""
+    return urlsplit(comic_url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+class MirrorHealth:
+    """记录各镜像的可用状态, 出错的镜像在冷却时间内不参与搜索"""
+
+    def __init__(self, cooldown=MIRROR_FAILURE_COOLDOWN):
+        self.cooldown = cooldown
+        self._unhealthy_until = {}
+
+    def is_healthy(self, key):
+        return self._unhealthy_until.get(key, 0) <= time.monotonic()
+
+    def record_success(self, key):
+        self._unhealthy_until.pop(key, None)
+
+    def record_failure(self, key):
+        self._unhealthy_until[key] = time.monotonic() + self.cooldown
+
+
+class SearchService:
+    """并行搜索所有可用镜像, 合并去重, 并缓存搜索结果和章节列表"""
+
+    def __init__(self):
+        self.health = MirrorHealth()
+        self.search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        self.comic_cache = TTLCache(COMIC_CACHE_SIZE, COMIC_CACHE_TTL)
+        self._search_flight = SingleFlight()  # 合并相同关键词/漫画的并发请求
+        self._comic_flight = SingleFlight()
+
+    def _healthy_mirrors(self):
+        mirrors = get_all_mirrors()
+        healthy = {key: mirror for key, mirror in mirrors.items() if self.health.is_healthy(key)}
+        # 全部不可用时仍然全部尝试一次
+        return healthy or mirrors
+
+    async def _search_mirror(self, key, mirror, keyword):
+        base_url = mirror["base_url"]
+        search_url = f"{base_url}/search?{urlencode({'q': keyword})}"
+        try:
+            html = await fetch(search_url, read_timeout=MIRROR_TIMEOUT)
+            results = parse_search_results(html.decode("utf-8", "ignore"), base_url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"镜像 {mirror['name']} 搜索失败: {e}")
+            self.health.record_failure(key)
+            return []
+        self.health.record_success(key)
+        logger.debug(f"镜像 {mirror['name']} 搜索到 {len(results)} 个结果")
+        return results
+
+    async def search_stream(self, keyword):
+        """异步生成器: 每个镜像返回后立即产出其中新出现的结果"""
+        cached = self.search_cache.get(keyword)
+        if cached is not None:
+            logger.info(f"搜索漫画 (缓存): {keyword}")
+            yield list(cached)
+            return
+
+        logger.info(f"搜索漫画 (并行): {keyword}")
+        seen = set()
+        merged = []
+        pending = [
+            asyncio.create_task(self._search_mirror(key, mirror, keyword))
+            for key, mirror in self._healthy_mirrors().items()
+        ]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                batch = []
+                for result in await next_done:
+                    slug = comic_slug(result["url"])
+                    if slug not in seen:
+                        seen.add(slug)
+                        batch.append(result)
+                if batch:
+                    merged.extend(batch)
+                    yield batch
+        finally:
+            for task in pending:
+                task.cancel()
+        if merged:
+            self.search_cache.set(keyword, merged)
+        logger.info(f"搜索到 {len(merged)} 个结果")
+
+    async def search(self, keyword):
+        """等待所有镜像返回, 返回合并后的结果"""
+        return list(await self._search_flight.do(keyword, lambda: self._search(keyword)))
+
+    async def _search(self, keyword):
+        results = []
+        async for batch in self.search_stream(keyword):
+            results.extend(batch)
+        return results
+
+    async def get_chapter_list(self, comic_url):
+        """获取章节列表 (异步, 带缓存)"""
+        chapters = self.comic_cache.get(comic_url)
+        if chapters is not None:
+            logger.info(f"获取章节列表 (缓存): {comic_url}")
+            return list(chapters)
+        return list(await self._comic_flight.do(comic_url, lambda: self._get_chapter_list(comic_url)))
+
+    async def _get_chapter_list(self, comic_url):
+        logger.info(f"获取章节列表: {comic_url}")
+        parts = urlsplit(comic_url)
+        base_url = f"{parts.scheme}://{parts.netloc}"
+        try:
+            html = await fetch(comic_url)
+            chapters = parse_chapter_list(html.decode("utf-8", "ignore"), base_url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"获取章节列表失败: {e}")
+            return []
+        if chapters:
+            self.comic_cache.set(comic_url, chapters)
+        logger.info(f"获取到 {len(chapters)} 个章节")
+        return chapters
+
+
+# 全局 SearchService (模块级别)
+search_service = SearchService()
@@ -0,0 +1,229 @@
+# service.py
+import argparse
+import asyncio
+import json
+import os
+from aiohttp import web
+from task_manager import TaskManager
+from search_service import search_service
+from session_manager import session_manager
+from diagnostics import Diagnostics
+from scheduler import SCHEDULE_POLICIES, POLICY_FIFO
+from utils import windows_asyncio_fix, setup_logger, sanitize_filename, parse_chapter_range
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"  # 默认只监听本机
+DEFAULT_PORT = 8787
+EVENT_INTERVAL = 0.25  # 进度事件的最小推送间隔 (秒)
+EVENT_HEARTBEAT = 15  # 没有变化时的心跳间隔 (秒)
+
+
+def task_summary(task):
+    data = task.to_dict()
+    del data["img_links"]
+    return data
+
+
+class DownloadService:
+    """无界面的下载服务: 包装 TaskManager, 提供本地 HTTP/JSON 接口和 SSE 进度推送"""
+
+    def __init__(self, token=None, schedule_policy=POLICY_FIFO, diagnostics=None):
+        self.token = token
+        self.schedule_policy = schedule_policy
+        self.diagnostics = diagnostics
+        self.task_manager = None
+        self._subscribers = set()  # 每个 SSE 连接一个 asyncio.Event
+
+    def _notify(self):
+        for event in self._subscribers:
+            event.set()
+
+    async def on_startup(self, app):
+        if self.diagnostics:
+            self.diagnostics.start()
+        self.task_manager = TaskManager(gui_update_callback=self._notify, schedule_policy=self.schedule_policy)
+        logger.info("下载服务已启动")
+
+    async def on_cleanup(self, app):
+        await self.task_manager.close()
+        if self.diagnostics:
+            self.diagnostics.stop()
+        logger.info("下载服务已停止")
+
+    @web.middleware
+    async def auth_middleware(self, request, handler):
+        if self.token and request.headers.get("Authorization") != f"Bearer {self.token}":
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return await handler(request)
+
+    @web.middleware
+    async def error_middleware(self, request, handler):
+        try:
+            return await handler(request)
+        except web.HTTPException:
+            raise
+        except (ValueError, KeyError, TypeError) as e:
+            return web.json_response({"error": f"无效的请求: {e}"}, status=400)
+
+    def find_task(self, chapter_url):
+        manager = self.task_manager
+        for task in manager.downloading_tasks:
+            if task["chapter_url"] == chapter_url:
+                return task
+        task = manager.scheduler.find(chapter_url)
+        if task is not None:
+            return task
+        for task in manager.paused_tasks:
+            if task["chapter_url"] == chapter_url:
+                return task
+        raise web.HTTPNotFound(text=json.dumps({"error": "任务不存在"}), content_type="application/json")
+
+    async def _enqueue(self, chapters, comic_name, priority=0, submitter=None):
+        comic_name = sanitize_filename(comic_name)
+        comic_download_folder = os.path.join("comic", comic_name)
+        added = 0
+        for chapter in chapters:
+            if self.task_manager.has_task(chapter["url"]):
+                continue
+            await self.task_manager.add_task(
+                chapter["url"], chapter["name"], comic_download_folder, 0, [], comic_name, priority,
+                submitter=submitter,
+            )
+            added += 1
+        return added
+
+    # --- 接口 ---
+
+    async def handle_status(self, request):
+        status = self.task_manager.get_progress()
+        if session_manager.proxy_pool.enabled:
+            status["proxies"] = session_manager.proxy_pool.stats()
+        return web.json_response(status)
+
+    async def handle_tasks(self, request):
+        manager = self.task_manager
+        limit = int(request.query.get("limit", 200))
+        return web.json_response({
+            "downloading": [task_summary(task) for task in manager.downloading_tasks],
+            "waiting": [task_summary(task) for task in manager.waiting_tasks[:limit]],
+            "paused": [task_summary(task) for task in manager.paused_tasks],
+            "completed": [task_summary(task) for task in list(manager.completed_tasks)[-limit:]],
+            "error": [task_summary(task) for task in list(manager.error_tasks)[-limit:]],
+            "paused_all": manager.paused,
+        })
+
+    async def handle_search(self, request):
+        body = await request.json()
+        results = await search_service.search(body["keyword"])
+        return web.json_response({"results": results})
+
+    async def handle_add_comic(self, request):
+        """{"url": 漫画地址, "name": 漫画名, "chapters": "1-50", "priority": 0, "submitter": 可选}"""
+        body = await request.json()
+        chapters = await search_service.get_chapter_list(body["url"])
+        if not chapters:
+            return web.json_response({"error": "获取章节失败"}, status=502)
+        selected = [chapters[i] for i in parse_chapter_range(body.get("chapters"), len(chapters))]
+        name = body.get("name") or body["url"].rstrip("/").rsplit("/", 1)[-1]
+        added = await self._enqueue(selected, name, int(body.get("priority", 0)), body.get("submitter"))
+        return web.json_response({"added": added, "selected": len(selected), "total": len(chapters)})
+
+    async def handle_add_chapters(self, request):
+        """{"comic_name": 漫画名, "chapters": [{"url": ..., "name": ...}], "priority": 0, "submitter": 可选}"""
+        body = await request.json()
+        added = await self._enqueue(
+            body["chapters"], body["comic_name"], int(body.get("priority", 0)), body.get("submitter")
+        )
+        return web.json_response({"added": added})
+
+    async def handle_task_action(self, request):
+        action = request.match_info["action"]
+        body = await request.json()
+        task = self.find_task(body["chapter_url"])
+        manager = self.task_manager
+        if action == "cancel":
+            await manager.cancel_task(task)
+        elif action == "pause":
+            await manager.pause_task(task)
+        elif action == "resume":
+            await manager.resume_task(task)
+        elif action == "move":
+            manager.move_task(task, body["direction"])
+        elif action == "priority":
+            manager.set_priority(task, int(body["priority"]))
+        else:
+            raise web.HTTPNotFound()
+        return web.json_response({"ok": True, "status": task["status"]})
+
+    async def handle_pause_all(self, request):
+        await self.task_manager.pause_all()
+        return web.json_response({"ok": True})
+
+    async def handle_resume_all(self, request):
+        await self.task_manager.resume_all()
+        return web.json_response({"ok": True})
+
+    async def handle_events(self, request):
+        """SSE: 任务状态变化时推送进度快照 (限制推送频率)"""
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+        })
+        await response.prepare(request)
+        changed = asyncio.Event()
+        changed.set()  # 连接后立即推送一次
+        self._subscribers.add(changed)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(changed.wait(), EVENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    await response.write(b": heartbeat\n\n")
+                    continue
+                changed.clear()
+                data = json.dumps(self.task_manager.get_progress(), ensure_ascii=False)
+                await response.write(f"event: progress\ndata: {data}\n\n".encode("utf-8"))
+                await asyncio.sleep(EVENT_INTERVAL)
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self._subscribers.discard(changed)
+        return response
+
+    def create_app(self):
+        app = web.Application(middlewares=[self.auth_middleware, self.error_middleware])
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        app.router.add_get("/api/status", self.handle_status)
+        app.router.add_get("/api/tasks", self.handle_tasks)
+        app.router.add_get("/api/events", self.handle_events)
+        app.router.add_post("/api/search", self.handle_search)
+        app.router.add_post("/api/comics", self.handle_add_comic)
+        app.router.add_post("/api/chapters", self.handle_add_chapters)
+        app.router.add_post("/api/tasks/{action}", self.handle_task_action)
+        app.router.add_post("/api/pause", self.handle_pause_all)
+        app.router.add_post("/api/resume", self.handle_resume_all)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面下载服务 (本地 HTTP/JSON 接口)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token", default=os.environ.get("BAOZIMH_TOKEN"), help="可选的访问令牌 (Bearer)")
+    parser.add_argument("--policy", choices=SCHEDULE_POLICIES, default=POLICY_FIFO, help="漫画内的排序策略")
+    parser.add_argument("--diagnostics", nargs="?", const="", metavar="REPORT", help="开启诊断模式, 可指定报告文件")
+    parser.add_argument("--profile", action="store_true", help="诊断模式下同时记录 cProfile")
+    args = parser.parse_args()
+
+    windows_asyncio_fix()
+    diagnostics = Diagnostics.from_env(args.diagnostics is not None, args.diagnostics, args.profile)
+    service = DownloadService(token=args.token, schedule_policy=args.policy, diagnostics=diagnostics)
+    logger.info(f"监听 http://{args.host}:{args.port}")
+    web.run_app(service.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# session_manager.py
+import asyncio
+import time
+from urllib.parse import urlsplit
+import aiohttp
+from utils import (
+    setup_logger, DEFAULT_HEADERS, HTML_POOL_SIZE, IMAGE_POOL_SIZE,
+    DNS_CACHE_TTL, KEEPALIVE_TIMEOUT, MAX_CONCURRENT_IMAGES
+)
+from proxy_pool import ProxyPool
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+
+class SessionManager:
+    """管理网页和图片两个独立的连接池 (DNS 缓存 + keep-alive + 连接预热)
+
+    配置了出口代理时, 每个代理使用自己的连接池, 图片请求由 proxy_pool 分配
+    """
+
+    def __init__(self, html_limit=HTML_POOL_SIZE, image_limit=IMAGE_POOL_SIZE,
+                 dns_ttl=DNS_CACHE_TTL, keepalive_timeout=KEEPALIVE_TIMEOUT, proxy_pool=None):
+        self.html_limit = html_limit
+        self.image_limit = image_limit
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._html_session = None
+        self._image_session = None
+        self._warmed_hosts = {}  # origin -> 上次预热时间
+        self._warmup_tasks = set()
+        self.proxy_pool = proxy_pool if proxy_pool is not None else ProxyPool()
+
+    def _create_session(self, limit, name, proxy_url=None, limit_per_host=0):
+        if limit_per_host:
+            logger.info(f"创建 {name} session (每个主机连接数上限 {limit_per_host})")
+        else:
+            logger.info(f"创建 {name} session (连接数上限 {limit})")
+        connector_options = dict(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        if proxy_url and proxy_url.startswith("socks"):
+            # SOCKS 代理需要可选依赖 aiohttp_socks
+            try:
+                from aiohttp_socks import ProxyConnector
+            except ImportError:
+                raise RuntimeError(f"使用 SOCKS 代理需要安装 aiohttp_socks: {proxy_url}")
+            connector = ProxyConnector.from_url(proxy_url, **connector_options)
+            return aiohttp.ClientSession(headers=DEFAULT_HEADERS, connector=connector)
+        connector = aiohttp.TCPConnector(**connector_options)
+        return aiohttp.ClientSession(headers=DEFAULT_HEADERS, connector=connector, proxy=proxy_url)
+
+    async def html_session(self):
+        """镜像站网页请求使用的 session"""
+        if self._html_session is None or self._html_session.closed:
+            # 按镜像分别限制连接数: 卡住的镜像只占用自己的连接, 不会让其他镜像的请求排队
+            self._html_session = self._create_session(0, "网页", limit_per_host=self.html_limit)
+        return self._html_session
+
+    async def image_session(self):
+        """CDN 图片请求使用的 session"""
+        if self._image_session is None or self._image_session.closed:
+            self._image_session = self._create_session(self.image_limit, "图片")
+        return self._image_session
+
+    async def image_egress(self):
+        """选择图片请求的出口, 返回 (session, proxy); 没有配置代理时 proxy 为 None"""
+        proxy = self.proxy_pool.choose()
+        if proxy is None:
+            return await self.image_session(), None
+        if proxy.session is None or proxy.session.closed:
+            proxy.session = self._create_session(self.image_limit, f"出口 {proxy.name}", proxy.url)
+        return proxy.session, proxy
+
+    async def _image_sessions(self):
+        if not self.proxy_pool.enabled:
+            return [await self.image_session()]
+        sessions = []
+        for proxy in self.proxy_pool.proxies:
+            if proxy.ejected:
+                continue
+            if proxy.session is None or proxy.session.closed:
+                proxy.session = self._create_session(self.image_limit, f"出口 {proxy.name}", proxy.url)
+            sessions.append(proxy.session)
+        return sessions
+
+    async def warmup(self, url, connections=MAX_CONCURRENT_IMAGES):
+        """提前和图片所在主机建立连接 (完成 DNS 和 TLS 握手), 之后的图片请求直接复用"""
+        parts = urlsplit(url)
+        if not parts.scheme or not parts.netloc:
+            return
+        origin = f"{parts.scheme}://{parts.netloc}"
+        now = time.monotonic()
+        last = self._warmed_hosts.get(origin)
+        if last is not None and now - last < self.keepalive_timeout:
+            return
+        self._warmed_hosts[origin] = now
+
+        sessions = await self._image_sessions()
+
+        async def open_one(session):
+            try:
+                async with session.head(origin + "/", allow_redirects=False,
+                                        timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    await response.release()
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                logger.debug(f"预热连接失败: {origin}, 错误: {e}")
+
+        connections = max(1, min(connections, self.image_limit))
+        await asyncio.gather(*(open_one(session) for session in sessions for _ in range(connections)))
+        logger.debug(f"已预热 {connections} x {len(sessions)} 个连接: {origin}")
+
+    def warmup_in_background(self, url, connections=MAX_CONCURRENT_IMAGES):
+        """在后台预热连接, 不阻塞调用方"""
+        task = asyncio.create_task(self.warmup(url, connections))
+        self._warmup_tasks.add(task)
+        task.add_done_callback(self._warmup_tasks.discard)
+
+    async def close(self):
+        for task in list(self._warmup_tasks):
+            task.cancel()
+        for session in (self._html_session, self._image_session):
+            if session and not session.closed:
+                await session.close()
+        await self.proxy_pool.close()
+        self._warmed_hosts.clear()
+
+
+# 全局 SessionManager (模块级别)
+session_manager = SessionManager()
@@ -3,53 +3,73 @@ import asyncio
 import json
 import os
 from downloader import download_images_async, get_image_links, close_session
-from utils import sanitize_filename, setup_logger
+from session_manager import session_manager
+from scheduler import TaskScheduler, POLICY_FIFO
+from task_record import Task, TaskHistory
+from progress import TransferStats
+import time
+from utils import sanitize_filename, setup_logger, MAX_CONCURRENT_IMAGES
 
 # 获取 logger 实例
 logger = setup_logger(__name__)
 
+# 被中断/暂停后继续的任务使用的优先级 (排在普通任务前面)
+RESUME_PRIORITY = 1
+# 字节级进度触发界面刷新的最小间隔 (秒)
+PROGRESS_UPDATE_INTERVAL = 0.25
+
 
 class TaskManager:
-    def __init__(self, gui_update_callback=None):
+    def __init__(self, gui_update_callback=None, schedule_policy=POLICY_FIFO, fair_share=True,
+                 image_concurrency=MAX_CONCURRENT_IMAGES):
         self.downloading_tasks = []  # 正在下载 (最多一个)
-        self.completed_tasks = []
-        self.error_tasks = []
-        self.waiting_tasks = []
+        self.completed_tasks = TaskHistory("completed")  # 只在内存中保留最近的任务
+        self.error_tasks = TaskHistory("error")
+        self.scheduler = TaskScheduler(schedule_policy, fair_share)  # 等待队列
+        self.paused_tasks = []  # 单独暂停的任务, 不参与调度
+        self.paused = False  # 全局暂停
         # self.cancelled_tasks = [] # 如果需要跟踪被取消的任务，可以启用
         self.gui_update_callback = gui_update_callback
         # self.load_progress()  # 初始加载也移除，按需加载
         self.max_concurrent_downloads = 2  # 严格限制为 2
+        self.image_concurrency = image_concurrency  # 每个章节同时下载的图片数
         self.download_tasks = {}  # 使用字典来存储所有创建的 asyncio.Task
-
-
-    async def add_task(self, chapter_url, chapter_name, comic_download_folder, total_images, img_links, comic_name):
-        """添加任务到等待队列 (不获取链接)"""
+        self._idle = asyncio.Event()  # 没有等待和正在下载的任务时置位
+        self._idle.set()
+        self.stats = TransferStats()  # 传输速率和剩余时间
+        self._last_progress_update = 0.0
+
+
+    @property
+    def waiting_tasks(self):
+        """等待队列 (按下载顺序排列的只读列表)"""
+        return self.scheduler.ordered()
+
+    def has_task(self, chapter_url):
+        """任务是否已经在 正在下载、等待、暂停、完成 列表中"""
+        return (
+            self.completed_tasks.has_url(chapter_url)
+            or self.scheduler.find(chapter_url) is not None
+            or any(task["chapter_url"] == chapter_url for task in self.downloading_tasks)
+            or any(task["chapter_url"] == chapter_url for task in self.paused_tasks)
+        )
+
+    async def add_task(self, chapter_url, chapter_name, comic_download_folder, total_images, img_links, comic_name, priority=0,
+                       submitter=None):
+        """添加任务到等待队列 (不获取链接), priority 越大越先下载, 有 submitter 时按提交者轮转"""
         logger.info(f"添加任务到等待队列: 章节 {chapter_name}, URL: {chapter_url}")
 
-        # 检查任务是否已经在 正在下载、等待、完成 列表中
-        for task_list in [self.downloading_tasks, self.waiting_tasks, self.completed_tasks]:
-            for existing_task in task_list:
-                if existing_task["chapter_url"] == chapter_url:
-                    logger.info(f"任务已存在: {chapter_name}")
-                    return
+        if self.has_task(chapter_url):
+            logger.info(f"任务已存在: {chapter_name}")
+            return
 
         safe_chapter_name = sanitize_filename(chapter_name)
         chapter_download_folder = os.path.join(comic_download_folder, safe_chapter_name)
 
-        task = {
-            "chapter_url": chapter_url,
-            "chapter_name": chapter_name,
-            "download_folder": chapter_download_folder,
-            "status": "waiting",
-            "progress": 0,
-            "total_images": 0,  # 初始为 0
-            "downloaded_images": 0,
-            "total_size": 0,
-            "downloaded_size": 0,
-            "img_links": [],  # 初始为空
-            "comic_name": comic_name, # 添加 comic_name
-        }
-        self.waiting_tasks.append(task)
+        # total_images 和 img_links 在 run_task 中获取
+        task = Task(chapter_url, chapter_name, chapter_download_folder, comic_name, submitter=submitter)
+        self.scheduler.push(task, priority)
+        self._idle.clear()
 
         if self.gui_update_callback:
             self.gui_update_callback()
@@ -58,70 +78,89 @@ class TaskManager:
             await self._start_next_task()
 
     async def _start_next_task(self):
-        """启动下一个任务 (获取链接并开始下载)"""
-        if self.waiting_tasks and not self.downloading_tasks:
-            task = self.waiting_tasks.pop(0)
+        """启动下一个任务 (获取链接和下载都在 run_task 中进行, 可以随时取消)"""
+        if not self.paused and self.scheduler and not self.downloading_tasks:
+            task = self.scheduler.pop()
             task["status"] = "downloading"
             self.downloading_tasks.append(task)
 
-            try:
-                img_links = await get_image_links(task["chapter_url"])  # 获取图片链接
-                if img_links:
-                    task["img_links"] = img_links
-                    task["total_images"] = len(img_links)
-                    logger.info(f"开始下载章节: {task['chapter_name']}, 共 {task['total_images']} 张图片")
-
-                    if self.gui_update_callback:
-                        self.gui_update_callback()
-                    
-                    # 添加一个小的延迟，确保前一个任务的资源已经释放
-                    await asyncio.sleep(0.5)
-                    
-                    # 使用 asyncio.create_task 启动下载, 并保存 task 对象
-                    download_task = asyncio.create_task(self.run_task(task))
-                    self.download_tasks[task['chapter_url']] = download_task
-
-                else:
-                    task["status"] = "error"
-                    self.downloading_tasks.remove(task)
-                    self.error_tasks.append(task)
-                    logger.error(f"获取章节 {task['chapter_name']} 图片链接失败")
-                    if self.gui_update_callback:
-                        self.gui_update_callback()
-                    await self._start_next_task()  # 尝试启动下一个
-
-            except Exception as e:
-                logger.exception(f"获取图片链接或启动任务时发生错误: {e}")
-                task["status"] = "error"
-                self.downloading_tasks.remove(task)
-                self.error_tasks.append(task)
-                if self.gui_update_callback:
-                    self.gui_update_callback()
-                await self._start_next_task()  # 尝试启动下一个
+            # 使用 asyncio.create_task 启动下载, 并保存 task 对象
+            download_task = asyncio.create_task(self.run_task(task))
+            self.download_tasks[task['chapter_url']] = download_task
+
+            if self.gui_update_callback:
+                self.gui_update_callback()
+
+        self._update_idle()
+
+    def _update_idle(self):
+        if self.scheduler or self.downloading_tasks:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    async def wait_until_idle(self):
+        """等待所有任务结束 (等待队列和正在下载都为空)"""
+        await self._idle.wait()
 
     async def run_task(self, task):
-        """运行下载任务"""
+        """运行下载任务 (获取图片链接并下载)"""
         logger.info(f"run_task 开始执行: {task['chapter_name']}")
 
+        failed_images = 0
+
         def progress_callback(downloaded, total):
+            nonlocal failed_images
+            if not downloaded:
+                failed_images += total
             task["downloaded_images"] += downloaded
             task["progress"] = (task["downloaded_images"] / task["total_images"]) * 100
             if self.gui_update_callback:
                 self.gui_update_callback()
             # logger.debug(f"任务 {task['chapter_name']} 进度: {task['progress']:.2f}%") # 调试进度也移除
 
+        def transfer_callback(nbytes, image_size=None):
+            self.stats.on_transfer(task, nbytes, image_size)
+            # 按字节的进度更新很频繁, 限制界面刷新频率
+            now = time.monotonic()
+            if self.gui_update_callback and now - self._last_progress_update >= PROGRESS_UPDATE_INTERVAL:
+                self._last_progress_update = now
+                self.gui_update_callback()
+
         try:
-            # 直接传入 task["img_links"]
-            await download_images_async(task["img_links"], task["download_folder"], progress_callback)
+            img_links = await get_image_links(task["chapter_url"])  # 获取图片链接
+            if not img_links:
+                raise RuntimeError("获取图片链接失败")
+            task["img_links"] = img_links
+            task["total_images"] = len(img_links)
+            # 暂停后继续时, 已下载的图片会被跳过并重新计数
+            task["downloaded_images"] = 0
+            task["downloaded_size"] = 0
+            logger.info(f"开始下载章节: {task['chapter_name']}, 共 {task['total_images']} 张图片")
+
+            if self.gui_update_callback:
+                self.gui_update_callback()
+
+            # 在等待期间预热到图片主机的连接, 避免首批图片承担 TLS 握手
+            session_manager.warmup_in_background(img_links[0])
+
+            # 添加一个小的延迟，确保前一个任务的资源已经释放
+            await asyncio.sleep(0.5)
+
+            await download_images_async(task["img_links"], task["download_folder"], progress_callback,
+                                        transfer_callback, self.image_concurrency, task["chapter_url"])
             # 只有在下载完全成功的情况下，才将任务状态设置为 "completed"
+            if failed_images:
+                raise RuntimeError(f"{failed_images} 张图片下载失败")
             if task["status"] == "downloading":
                 task["status"] = "completed"
                 logger.info(f"任务完成: {task['chapter_name']}")
 
         except asyncio.CancelledError:
-            logger.info(f"任务 {task['chapter_name']} 被取消")
-            task["status"] = "cancelled"  # 标记为已取消, 但不放入 error_tasks
-
+            # 状态由 cancel_task / pause_task / pause_all 预先设置
+            logger.info(f"任务 {task['chapter_name']} 被中断, 状态: {task['status']}")
+            if task["status"] == "downloading":
+                task["status"] = "cancelled"  # 标记为已取消, 但不放入 error_tasks
 
         except Exception as e:
             logger.exception(f"下载任务 {task['chapter_name']} 失败: {e}")
@@ -130,12 +169,19 @@ class TaskManager:
         finally:
             if task['chapter_url'] in self.download_tasks:
                 del self.download_tasks[task['chapter_url']]
+            self.stats.on_task_finished(task)
 
-            self.downloading_tasks.remove(task)
+            if task in self.downloading_tasks:
+                self.downloading_tasks.remove(task)
             if task["status"] == "completed":
                 self.completed_tasks.append(task)
             elif task["status"] == "error":
                 self.error_tasks.append(task)
+            elif task["status"] == "paused":
+                self.paused_tasks.append(task)
+            elif task["status"] == "waiting":
+                # 全局暂停时放回等待队列最前面
+                self.scheduler.push(task, RESUME_PRIORITY)
             # 如果是被取消的，则不添加到任何列表, 如果需要跟踪，可以添加到 cancelled_tasks
 
             if self.gui_update_callback:
@@ -143,16 +189,25 @@ class TaskManager:
             # self.save_progress()  # run_task 完成时不保存
             await self._start_next_task()
 
+    async def _interrupt(self, task, status):
+        """中断正在下载的任务, 并等待它释放连接"""
+        task["status"] = status
+        download_task = self.download_tasks.get(task["chapter_url"])
+        if download_task is not None and not download_task.done():
+            download_task.cancel()
+            # run_task 会吞掉 CancelledError, 在 finally 中移出列表并立即启动下一个任务
+            await asyncio.wait({download_task})
+
     async def cancel_task(self, task):
-        """取消任务 (改进版)"""
+        """取消任务 (正在下载的任务会立即中断, 已下载的图片保留)"""
         logger.info(f"取消任务: {task['chapter_name']}")
-        # 移除对download_task的cancel
         if task in self.downloading_tasks:
-            # task["status"] = "cancelled" # 不需要设置状态
-            self.downloading_tasks.remove(task)
+            await self._interrupt(task, "cancelled")
+            return
 
-        elif task in self.waiting_tasks:
-            self.waiting_tasks.remove(task)
+        if not self.scheduler.remove(task) and task in self.paused_tasks:
+            self.paused_tasks.remove(task)
+        task["status"] = "cancelled"
 
         if self.gui_update_callback:
             self.gui_update_callback()
@@ -160,40 +215,99 @@ class TaskManager:
         # 触发 _start_next_task()
         await self._start_next_task()
 
+    async def pause_task(self, task):
+        """暂停单个任务 (正在下载的任务会立即中断, 已下载的图片保留)"""
+        logger.info(f"暂停任务: {task['chapter_name']}")
+        if task in self.downloading_tasks:
+            await self._interrupt(task, "paused")
+            return
+        if self.scheduler.remove(task):
+            task["status"] = "paused"
+            self.paused_tasks.append(task)
+            self._update_idle()
+            if self.gui_update_callback:
+                self.gui_update_callback()
+
+    async def resume_task(self, task):
+        """继续已暂停的任务 (排到等待队列最前面)"""
+        if task not in self.paused_tasks:
+            return
+        logger.info(f"继续任务: {task['chapter_name']}")
+        self.paused_tasks.remove(task)
+        task["status"] = "waiting"
+        self.scheduler.push(task, RESUME_PRIORITY)
+        if self.gui_update_callback:
+            self.gui_update_callback()
+        await self._start_next_task()
+
+    async def pause_all(self):
+        """全局暂停: 不再启动新任务, 正在下载的任务中断后放回等待队列"""
+        logger.info("全部暂停")
+        self.paused = True
+        for task in list(self.downloading_tasks):
+            await self._interrupt(task, "waiting")
+        if self.gui_update_callback:
+            self.gui_update_callback()
+
+    async def resume_all(self):
+        """取消全局暂停"""
+        logger.info("全部继续")
+        self.paused = False
+        await self._start_next_task()
+
+    def get_progress(self):
+        """当前进度快照 (字节数、速率、剩余时间), 供界面和其他程序使用"""
+        downloading = [
+            {
+                "chapter_url": task["chapter_url"],
+                "comic_name": task["comic_name"],
+                "chapter_name": task["chapter_name"],
+                "downloaded_images": task["downloaded_images"],
+                "total_images": task["total_images"],
+                "downloaded_size": task["downloaded_size"],
+                "total_size": task["total_size"],
+                "rate": self.stats.task_rate(task),
+                "eta": self.stats.task_eta(task),
+            }
+            for task in self.downloading_tasks
+        ]
+        return {
+            "rate": self.stats.total.rate(),
+            "eta": self.stats.queue_eta(self.downloading_tasks, len(self.scheduler)),
+            "downloading": downloading,
+            "waiting": len(self.scheduler),
+            "paused": len(self.paused_tasks),
+            "completed": self.completed_tasks.total,
+            "error": self.error_tasks.total,
+        }
+
     def move_task(self, task, direction):
         """调整任务顺序 (仅等待队列)"""
         logger.info(f"移动任务: {task['chapter_name']}, 方向: {direction}")
-        if task in self.waiting_tasks:
-            index = self.waiting_tasks.index(task)
-            if direction == "up" and index > 0:
-                self.waiting_tasks[index], self.waiting_tasks[index - 1] = (
-                    self.waiting_tasks[index - 1],
-                    self.waiting_tasks[index],
-                )
-            elif direction == "down" and index < len(self.waiting_tasks) - 1:
-                self.waiting_tasks[index], self.waiting_tasks[index + 1] = (
-                    self.waiting_tasks[index + 1],
-                    self.waiting_tasks[index],
-                )
-            elif direction == "top":
-                self.waiting_tasks.remove(task)
-                self.waiting_tasks.insert(0, task)
-            elif direction == "bottom":
-                self.waiting_tasks.remove(task)
-                self.waiting_tasks.append(task)
-
+        if self.scheduler.move(task, direction):
             if self.gui_update_callback:
                 self.gui_update_callback()
             # self.save_progress()  # 移动任务时不保存
 
+    def set_priority(self, task, priority):
+        """修改等待中任务的优先级"""
+        logger.info(f"设置任务优先级: {task['chapter_name']}, 优先级: {priority}")
+        self.scheduler.set_priority(task, priority)
+        if self.gui_update_callback:
+            self.gui_update_callback()
+
+    def set_schedule_policy(self, policy):
+        """修改漫画内的排序策略 (只影响之后加入的任务)"""
+        self.scheduler.policy = policy
+
     def save_progress(self):
         """保存进度"""
         logger.debug("保存进度")
         data = {
-            "downloading": self.downloading_tasks,
-            "completed": self.completed_tasks,
-            "error": self.error_tasks,
-            "waiting": self.waiting_tasks,
+            "downloading": [task.to_dict() for task in self.downloading_tasks],
+            "completed": [task.to_dict() for task in self.completed_tasks],
+            "error": [task.to_dict() for task in self.error_tasks],
+            "waiting": [task.to_dict() for task in self.waiting_tasks],
             # "cancelled": self.cancelled_tasks,  # 如果有 cancelled_tasks
         }
         with open("progress.json", "w", encoding="utf-8") as f:
@@ -205,28 +319,34 @@ class TaskManager:
         try:
             with open("progress.json", "r", encoding="utf-8") as f:
                 data = json.load(f)
-                self.downloading_tasks = data.get("downloading", [])
-                self.completed_tasks = data.get("completed", [])
-                self.error_tasks = data.get("error", [])
-                self.waiting_tasks = data.get("waiting", [])
+                downloading_tasks = [Task.from_dict(item) for item in data.get("downloading", [])]
+                waiting_tasks = [Task.from_dict(item) for item in data.get("waiting", [])]
+                self.completed_tasks.clear()
+                self.error_tasks.clear()
+                for item in data.get("completed", []):
+                    self.completed_tasks.append(Task.from_dict(item))
+                for item in data.get("error", []):
+                    self.error_tasks.append(Task.from_dict(item))
                 # self.cancelled_tasks = data.get("cancelled", []) # 如果有 cancelled_tasks
 
-            for task in self.downloading_tasks:
-                task["status"] = "waiting"
-                self.downloading_tasks.remove(task)
-                self.waiting_tasks.append(task)
+            # 之前正在下载的任务放回等待队列最前面
+            for priority, tasks in ((RESUME_PRIORITY, downloading_tasks), (0, waiting_tasks)):
+                for task in tasks:
+                    task.status = "waiting"
+                    if self.scheduler.find(task.chapter_url) is None:
+                        self.scheduler.push(task, priority)
             # cancelled_tasks 的任务不需要处理，因为它们已经被取消了
 
-            if not self.downloading_tasks and self.waiting_tasks:
+            if not self.downloading_tasks and self.scheduler:
                 asyncio.create_task(self._start_next_task())
 
         except FileNotFoundError:
             logger.info("进度文件不存在")
 
     async def close(self):
-         # 取消所有正在下载的任务
-        for task in self.downloading_tasks:
-            await self.cancel_task(task) # 现在 cancel_task 只是从列表中移除
+        # 先停止调度, 再中断所有正在下载的任务
+        self.paused = True
+        for task in list(self.downloading_tasks):
+            await self._interrupt(task, "cancelled")
         await close_session()
         #self.save_progress() # 在程序关闭的时候保存进度
-
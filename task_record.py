@@ -0,0 +1,129 @@
+# task_record.py
+import collections
+import json
+import os
+from utils import setup_logger
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 历史记录目录, 超出内存窗口的已完成/出错任务追加写入这里
+HISTORY_DIR = "history"
+# 内存中保留的历史任务数量
+HISTORY_WINDOW = 200
+
+
+class Task:
+    """下载任务 (使用 __slots__ 的紧凑记录, 兼容原来的字典访问方式 task["key"])"""
+
+    __slots__ = (
+        "chapter_url", "chapter_name", "download_folder", "status", "progress",
+        "total_images", "downloaded_images", "total_size", "downloaded_size",
+        "img_links", "comic_name", "submitter",
+    )
+
+    def __init__(self, chapter_url, chapter_name, download_folder, comic_name, status="waiting",
+                 progress=0, total_images=0, downloaded_images=0, total_size=0, downloaded_size=0,
+                 img_links=(), submitter=None):
+        self.chapter_url = chapter_url
+        self.chapter_name = chapter_name
+        self.download_folder = download_folder
+        self.comic_name = comic_name
+        self.status = status
+        self.progress = progress
+        self.total_images = total_images
+        self.downloaded_images = downloaded_images
+        self.total_size = total_size
+        self.downloaded_size = downloaded_size
+        self.img_links = img_links
+        self.submitter = submitter  # 提交者 (服务模式), 公平调度时按提交者轮转
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __repr__(self):
+        return f"Task({self.comic_name!r}, {self.chapter_name!r}, status={self.status!r})"
+
+    def release_links(self):
+        """任务结束后释放图片链接列表"""
+        self.img_links = ()
+
+    def to_dict(self):
+        data = {key: getattr(self, key) for key in self.__slots__}
+        data["img_links"] = list(self.img_links)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        fields = {key: data[key] for key in cls.__slots__ if key in data}
+        fields["img_links"] = tuple(fields.get("img_links") or ())
+        return cls(**fields)
+
+
+class TaskHistory:
+    """已完成/出错任务的有界历史: 内存中只保留最近的一部分, 更早的追加到磁盘上的 JSONL 文件"""
+
+    def __init__(self, name, max_in_memory=HISTORY_WINDOW, history_dir=HISTORY_DIR):
+        self.path = os.path.join(history_dir, f"{name}.jsonl")
+        self.max_in_memory = max_in_memory
+        self._recent = collections.deque()
+        self._urls = collections.Counter()  # 内存窗口内的章节 URL
+        self.archived = 0  # 本次运行中写入磁盘的数量
+
+    def __len__(self):
+        return len(self._recent)
+
+    def __iter__(self):
+        return iter(self._recent)
+
+    def __getitem__(self, index):
+        return self._recent[index]
+
+    @property
+    def total(self):
+        """本次运行的历史总数 (内存 + 磁盘)"""
+        return len(self._recent) + self.archived
+
+    def has_url(self, chapter_url):
+        return chapter_url in self._urls
+
+    def append(self, task):
+        task.release_links()
+        self._recent.append(task)
+        self._urls[task.chapter_url] += 1
+        if len(self._recent) > self.max_in_memory:
+            self._archive(self._recent.popleft())
+
+    def remove(self, task):
+        self._recent.remove(task)
+        self._forget(task)
+
+    def _forget(self, task):
+        self._urls[task.chapter_url] -= 1
+        if self._urls[task.chapter_url] <= 0:
+            del self._urls[task.chapter_url]
+
+    def _archive(self, task):
+        self._forget(task)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(task.to_dict(), ensure_ascii=False) + "\n")
+            self.archived += 1
+        except OSError as e:
+            logger.error(f"写入历史记录失败: {self.path}, 错误: {e}")
+
+    def clear(self):
+        self._recent.clear()
+        self._urls.clear()
@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+# 测试直接导入仓库根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 模块导入时会在当前目录写日志 (并清理旧日志), 缓存和历史文件也写在当前目录, 测试在临时目录中运行
+os.chdir(tempfile.mkdtemp(prefix="baozimh-tests-"))
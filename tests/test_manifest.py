@@ -0,0 +1,56 @@
+# tests/test_manifest.py
+import asyncio
+import json
+import manifest
+
+CHAPTERS_PER_COMIC = 5
+
+
+class FakeTaskManager:
+    """只记录加入的章节, 由 drain() 模拟下载消化等待队列"""
+
+    def __init__(self):
+        self.scheduler = []
+        self.peak = 0
+        self.added = 0
+
+    async def add_task(self, chapter_url, chapter_name, comic_download_folder, total_images, img_links, comic_name):
+        self.scheduler.append(chapter_url)
+        self.added += 1
+        self.peak = max(self.peak, len(self.scheduler))
+
+    async def drain(self, done):
+        while not (done.is_set() and not self.scheduler):
+            if self.scheduler:
+                self.scheduler.pop(0)
+            await asyncio.sleep(0)
+
+
+def test_import_manifest_applies_backpressure(tmp_path, monkeypatch):
+    path = tmp_path / "manifest.jsonl"
+    path.write_text("\n".join(json.dumps({"url": f"http://example.com/comic/{i}"}) for i in range(100)),
+                    encoding="utf-8")
+
+    async def fake_resolve(entry):
+        await asyncio.sleep(0)
+        return entry["url"].rsplit("/", 1)[-1], [
+            {"name": f"第{i}话", "url": f"{entry['url']}/{i}"} for i in range(CHAPTERS_PER_COMIC)
+        ]
+
+    monkeypatch.setattr(manifest, "resolve_entry", fake_resolve)
+    monkeypatch.setattr(manifest, "BACKPRESSURE_POLL_INTERVAL", 0.001)
+
+    async def run():
+        task_manager = FakeTaskManager()
+        done = asyncio.Event()
+        drainer = asyncio.create_task(task_manager.drain(done))
+        stats = await manifest.import_manifest(str(path), task_manager, concurrency=4, high_water=20)
+        done.set()
+        await drainer
+        return task_manager, stats
+
+    task_manager, stats = asyncio.run(run())
+    assert stats["comics"] == 100
+    assert task_manager.added == 100 * CHAPTERS_PER_COMIC
+    # 超过 high_water 后最多还有 concurrency 部漫画的章节在途
+    assert task_manager.peak <= 20 + 4 * CHAPTERS_PER_COMIC
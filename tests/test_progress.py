@@ -0,0 +1,67 @@
+# tests/test_progress.py
+import asyncio
+import pytest
+from aiohttp import web
+import downloader
+from progress import TransferStats
+from proxy_pool import ProxyPool
+from session_manager import SessionManager
+
+
+async def start_image_server():
+    async def image(request):
+        return web.Response(body=b"x" * 5000, content_type="image/jpeg")
+
+    async def slow_image(request):
+        response = web.StreamResponse()
+        response.content_length = 5000
+        await response.prepare(request)
+        for _ in range(5):
+            await response.write(b"x" * 1000)
+            await asyncio.sleep(0.05)
+        return response
+
+    app = web.Application()
+    app.router.add_get("/image.jpg", image)
+    app.router.add_get("/slow.jpg", slow_image)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_failed_attempt_bytes_are_withdrawn(monkeypatch):
+    monkeypatch.setattr(downloader, "session_manager", SessionManager(proxy_pool=ProxyPool(proxies=[])))
+    monkeypatch.setattr(downloader, "SPEED_CHECK_WINDOW", 0.01)
+    reported = []
+
+    async def run():
+        runner, base_url = await start_image_server()
+        try:
+            data = await downloader.fetch_image(f"{base_url}/image.jpg", transfer_callback=reported.append)
+            assert sum(reported) == len(data)
+            reported.clear()
+            with pytest.raises(downloader.StalledTransferError):
+                await downloader.fetch_image(f"{base_url}/slow.jpg", min_speed=10 ** 9,
+                                             transfer_callback=reported.append)
+            assert reported[0] > 0
+            assert sum(reported) == 0
+        finally:
+            await downloader.session_manager.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_withdrawn_bytes_do_not_count_as_downloaded():
+    stats = TransferStats()
+    task = {"chapter_url": "http://example.com/ch/1", "downloaded_size": 0, "total_size": 0,
+            "downloaded_images": 0, "total_images": 2, "status": "downloading"}
+    stats.on_transfer(task, 3000)
+    stats.on_transfer(task, -3000)  # 失败的请求
+    stats.on_transfer(task, 5000)
+    stats.on_transfer(task, 0, 5000)
+    assert task["downloaded_size"] == 5000
+    assert stats.bytes_downloaded == 5000
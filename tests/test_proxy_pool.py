@@ -0,0 +1,117 @@
+# tests/test_proxy_pool.py
+import asyncio
+import random
+import aiohttp
+from aiohttp import web
+import downloader
+from proxy_pool import Proxy, ProxyPool
+from session_manager import SessionManager
+from utils import PROXY_EJECT_FAILURES
+
+
+class ForwardProxy:
+    """本地 HTTP 转发代理替身, failing 为 True 时对所有请求返回 502"""
+
+    def __init__(self):
+        self.failing = False
+        self.requests = 0
+        self.url = None
+        self._runner = None
+        self._session = None
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.failing:
+            return web.Response(status=502)
+        # 代理收到的是绝对地址形式的请求, 转发给目标服务器
+        async with self._session.request(request.method, str(request.url)) as response:
+            return web.Response(body=await response.read(), status=response.status)
+
+    async def start(self):
+        self._session = aiohttp.ClientSession()
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        self.url, self._runner = await serve(app)
+
+    async def close(self):
+        await self._runner.cleanup()
+        await self._session.close()
+
+
+async def serve(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}", runner
+
+
+async def start_origin():
+    async def image(request):
+        return web.Response(body=b"x" * 5000, content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", image)
+    return await serve(app)
+
+
+def test_choose_is_weighted_by_throughput_and_errors():
+    random.seed(1)
+    fast, slow, flaky = Proxy("http://fast:1"), Proxy("http://slow:1"), Proxy("http://flaky:1")
+    pool = ProxyPool([fast, slow, flaky])
+    fast.throughput, slow.throughput, flaky.throughput = 8000.0, 1000.0, 8000.0
+    flaky.error_rate = 0.9
+    picks = {fast.name: 0, slow.name: 0, flaky.name: 0}
+    for _ in range(5000):
+        picks[pool.choose().name] += 1
+    assert picks[fast.name] > 5 * picks[slow.name]
+    assert picks[fast.name] > 5 * picks[flaky.name]
+
+    fast.ejected = True
+    assert all(pool.choose() is not fast for _ in range(200))
+
+
+def test_failing_proxy_is_ejected_and_readmitted(monkeypatch):
+    random.seed(2)
+
+    async def run():
+        origin_url, origin_runner = await start_origin()
+        good, bad = ForwardProxy(), ForwardProxy()
+        await good.start()
+        await bad.start()
+        bad.failing = True
+        pool = ProxyPool([Proxy(good.url), Proxy(bad.url)], probe_interval=0.05, probe_max_interval=0.1)
+        bad_proxy = pool.proxies[1]
+        manager = SessionManager(proxy_pool=pool)
+        monkeypatch.setattr(downloader, "session_manager", manager)
+        try:
+            results = []
+            for i in range(30):
+                try:
+                    results.append(await downloader.fetch_image(f"{origin_url}/{i}.jpg"))
+                except aiohttp.ClientResponseError:
+                    pass
+            assert good.requests > 0
+            assert bad.requests == PROXY_EJECT_FAILURES
+            assert bad_proxy.ejected
+            assert len(results) == 30 - PROXY_EJECT_FAILURES
+
+            # 代理恢复后由后台探测重新加入
+            bad.failing = False
+            for _ in range(100):
+                if not bad_proxy.ejected:
+                    break
+                await asyncio.sleep(0.02)
+            assert not bad_proxy.ejected
+            before = bad.requests
+            for i in range(30):
+                await downloader.fetch_image(f"{origin_url}/again/{i}.jpg")
+            assert bad.requests > before
+        finally:
+            await manager.close()
+            await good.close()
+            await bad.close()
+            await origin_runner.cleanup()
+
+    asyncio.run(run())
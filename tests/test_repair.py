@@ -0,0 +1,73 @@
+# tests/test_repair.py
+import asyncio
+import repair
+from downloader import read_chapter_metadata, write_chapter_metadata
+
+COMIC_URL = "http://example.com/comic/demo"
+IMAGES = [f"http://example.com/img/{i}.jpg" for i in range(3)]
+
+
+def setup_library(root):
+    # 旧版本下载的章节: 没有 .chapter.json, 文件序号和页码不一定对应
+    old = root / "示例漫画" / "第1话"
+    old.mkdir(parents=True)
+    (old / "image_1.jpg").write_bytes(b"x" * 10)
+    (old / "image_3.jpg").write_bytes(b"x" * 10)
+    # 有章节信息的章节, 缺少第 2 张图片
+    new = root / "示例漫画" / "第2话"
+    new.mkdir()
+    write_chapter_metadata(str(new), f"{COMIC_URL}/2", IMAGES)
+    (new / "image_1.jpg").write_bytes(b"x" * 10)
+    (new / "image_3.jpg").write_bytes(b"x" * 10)
+    # 章节列表中不存在的文件夹
+    (root / "示例漫画" / "番外").mkdir()
+    return old, new
+
+
+def fake_services(monkeypatch, downloaded):
+    async def search(keyword):
+        return [{"title": "示例漫画", "url": COMIC_URL}]
+
+    async def get_chapter_list(comic_url):
+        assert comic_url == COMIC_URL
+        return [{"name": "第1话", "url": f"{COMIC_URL}/1"}, {"name": "第2话", "url": f"{COMIC_URL}/2"}]
+
+    async def download_image(img_link, download_folder, i, progress_callback=None, chapter_url=None, **kwargs):
+        with open(repair.image_file_name(download_folder, i), "wb") as f:
+            f.write(b"y" * 20)
+        downloaded.append((download_folder, img_link))
+        progress_callback(1, 1)
+
+    monkeypatch.setattr(repair.search_service, "search", search)
+    monkeypatch.setattr(repair.search_service, "get_chapter_list", get_chapter_list)
+    monkeypatch.setattr(repair, "download_image", download_image)
+
+
+def test_folders_without_metadata_need_a_full_redownload(tmp_path, monkeypatch):
+    old, new = setup_library(tmp_path)
+    downloaded = []
+    fake_services(monkeypatch, downloaded)
+
+    stats = asyncio.run(repair.repair_library(str(tmp_path), concurrency=2))
+    # 只补全有章节信息的章节, 旧文件夹不按序号补全, 也不写入章节信息
+    assert downloaded == [(str(new), IMAGES[1])]
+    assert stats["repaired_images"] == 1
+    assert stats["needs_redownload"] == [
+        {"folder": str(old), "comic_url": COMIC_URL, "chapter": 1, "chapter_url": f"{COMIC_URL}/1"},
+    ]
+    assert stats["unresolved_folders"] == [str(tmp_path / "示例漫画" / "番外")]
+    assert read_chapter_metadata(str(old)) is None
+    assert sorted(path.name for path in old.iterdir()) == ["image_1.jpg", "image_3.jpg"]
+
+
+def test_dry_run_counts_only_chapters_with_metadata(tmp_path, monkeypatch):
+    old, new = setup_library(tmp_path)
+    downloaded = []
+    fake_services(monkeypatch, downloaded)
+
+    stats = asyncio.run(repair.repair_library(str(tmp_path), dry_run=True))
+    assert stats["missing_images"] == 1
+    assert stats["images"] == len(IMAGES)
+    assert len(stats["needs_redownload"]) == 1
+    assert downloaded == []
+    assert read_chapter_metadata(str(old)) is None
@@ -0,0 +1,106 @@
+# tests/test_scheduler.py
+import random
+from scheduler import TaskScheduler, POLICY_FIFO, POLICY_LATEST_FIRST
+from task_record import Task
+
+
+def make_task(comic, n):
+    return {"chapter_url": f"http://example.com/{comic}/{n}", "chapter_name": f"第{n}话", "comic_name": comic}
+
+
+def drain(scheduler):
+    tasks = []
+    while scheduler:
+        tasks.append(scheduler.pop())
+    assert scheduler.pop() is None
+    return tasks
+
+
+def names(tasks):
+    return [(task["comic_name"], task["chapter_name"]) for task in tasks]
+
+
+def test_fair_share_round_robin():
+    scheduler = TaskScheduler()
+    for n in range(3):
+        scheduler.push(make_task("a", n))
+    for n in range(2):
+        scheduler.push(make_task("b", n))
+    assert names(drain(scheduler)) == [
+        ("a", "第0话"), ("b", "第0话"), ("a", "第1话"), ("b", "第1话"), ("a", "第2话"),
+    ]
+
+
+def test_emptied_group_keeps_its_turn():
+    scheduler = TaskScheduler()
+    scheduler.push(make_task("a", 0))
+    assert scheduler.pop()["chapter_name"] == "第0话"  # a 的组在这里清空
+    scheduler.push(make_task("a", 1))
+    scheduler.push(make_task("a", 2))
+    scheduler.push(make_task("b", 0))
+    expected = [("b", "第0话"), ("a", "第1话"), ("a", "第2话")]
+    assert names(scheduler.ordered()) == expected
+    assert names(drain(scheduler)) == expected
+
+
+def test_fair_share_by_submitter():
+    scheduler = TaskScheduler()
+    # 同一个提交者的两部漫画算作一组, 和另一个提交者轮流下载
+    for comic in ("a", "b"):
+        for n in range(2):
+            scheduler.push(Task(f"http://example.com/{comic}/{n}", f"第{n}话", comic, comic, submitter="alice"))
+    scheduler.push(Task("http://example.com/c/0", "第0话", "c", "c", submitter="bob"))
+    order = drain(scheduler)
+    assert names(order) == [("a", "第0话"), ("c", "第0话"), ("a", "第1话"), ("b", "第0话"), ("b", "第1话")]
+    assert Task.from_dict(order[1].to_dict()).submitter == "bob"
+
+
+def test_latest_first_and_priority():
+    scheduler = TaskScheduler(policy=POLICY_LATEST_FIRST, fair_share=False)
+    tasks = [make_task("a", n) for n in range(3)]
+    for task in tasks:
+        scheduler.push(task)
+    scheduler.set_priority(tasks[0], 5)
+    assert drain(scheduler) == [tasks[0], tasks[2], tasks[1]]
+
+
+def test_remove_and_move():
+    scheduler = TaskScheduler(policy=POLICY_FIFO)
+    tasks = [make_task("a", n) for n in range(4)]
+    for task in tasks:
+        scheduler.push(task)
+    assert scheduler.remove(tasks[1])
+    assert not scheduler.remove(tasks[1])
+    assert scheduler.move(tasks[3], "top")
+    assert scheduler.ordered() == [tasks[3], tasks[0], tasks[2]]
+    assert scheduler.move(tasks[0], "down")
+    assert scheduler.ordered() == [tasks[3], tasks[2], tasks[0]]
+    assert drain(scheduler) == [tasks[3], tasks[2], tasks[0]]
+
+
+def test_ordered_matches_pop_order_under_random_operations():
+    rng = random.Random(1)
+    scheduler = TaskScheduler()
+    waiting = []
+    counter = 0
+    for _ in range(2000):
+        action = rng.random()
+        if action < 0.45 or not waiting:
+            task = make_task(rng.choice("abcd"), counter)
+            counter += 1
+            scheduler.push(task, rng.choice((0, 0, 1)))
+            waiting.append(task)
+        elif action < 0.6:
+            task = rng.choice(waiting)
+            assert scheduler.remove(task)
+            waiting.remove(task)
+        elif action < 0.75:
+            scheduler.move(rng.choice(waiting), rng.choice(("up", "down", "top", "bottom")))
+        else:
+            expected = scheduler.ordered()[0]
+            assert scheduler.pop() is expected
+            waiting.remove(expected)
+        assert len(scheduler) == len(waiting)
+    expected = list(scheduler.ordered())
+    assert drain(scheduler) == expected
+    assert sorted(task["chapter_url"] for task in expected) == sorted(task["chapter_url"] for task in waiting)
@@ -0,0 +1,59 @@
+# tests/test_search_service.py
+import asyncio
+from aiohttp import web
+import downloader
+import search_service as search_module
+from proxy_pool import ProxyPool
+from search_service import SearchService
+from session_manager import SessionManager
+from utils import SingleFlight
+
+SEARCH_PAGE = '<a class="comics-card__poster" href="/comic/shili" title="示例漫画"></a>'
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/search", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}", runner
+
+
+def test_hanging_mirrors_do_not_starve_a_working_one(monkeypatch):
+    async def run():
+        release = asyncio.Event()
+
+        async def hang(request):
+            await release.wait()
+            return web.Response(text="")
+
+        async def good(request):
+            return web.Response(text=SEARCH_PAGE, content_type="text/html")
+
+        servers = [await serve(hang), await serve(hang), await serve(good)]
+        mirrors = {
+            f"m{i}": {"name": f"镜像{i}", "base_url": url} for i, (url, _) in enumerate(servers)
+        }
+        manager = SessionManager(proxy_pool=ProxyPool([]))
+        monkeypatch.setattr(downloader, "session_manager", manager)
+        monkeypatch.setattr(downloader, "fetch_flight", SingleFlight())
+        monkeypatch.setattr(search_module, "get_all_mirrors", lambda: mirrors)
+        monkeypatch.setattr(search_module, "MIRROR_TIMEOUT", 0.3)
+        service = SearchService()
+        try:
+            # 卡住的镜像占满了自己的连接 (网页连接池默认每个主机 2 个)
+            results = await asyncio.gather(*(service.search(keyword) for keyword in ("a", "b", "c")))
+            for found in results:
+                assert [result["title"] for result in found] == ["示例漫画"]
+            assert service.health.is_healthy("m2")
+            assert not service.health.is_healthy("m0")
+        finally:
+            release.set()
+            await manager.close()
+            for _, runner in servers:
+                await runner.cleanup()
+
+    asyncio.run(run())
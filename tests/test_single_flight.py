@@ -0,0 +1,84 @@
+# tests/test_single_flight.py
+import asyncio
+import downloader
+from hedge import Hedger
+from utils import SingleFlight
+
+
+class SlowCall:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.started
+
+
+def test_concurrent_calls_share_one_request():
+    async def run():
+        flight = SingleFlight()
+        call = SlowCall()
+        results = await asyncio.gather(*(flight.do("key", call) for _ in range(5)))
+        assert results == [1] * 5
+        assert call.started == 1
+
+    asyncio.run(run())
+
+
+def test_cancelling_one_caller_keeps_the_request_for_others():
+    async def run():
+        flight = SingleFlight()
+        call = SlowCall()
+        first = asyncio.create_task(flight.do("key", call))
+        second = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == 1
+        assert call.cancelled == 0
+
+    asyncio.run(run())
+
+
+def test_request_is_cancelled_when_last_caller_times_out():
+    async def run():
+        flight = SingleFlight()
+        call = SlowCall(delay=10)
+        try:
+            await asyncio.wait_for(flight.do("key", call), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0)
+        assert call.cancelled == 1
+        # 之后的调用重新发起请求
+        call.delay = 0.01
+        assert await flight.do("key", call) == 2
+
+    asyncio.run(run())
+
+
+def test_hedge_with_single_mirror_sends_a_second_request(monkeypatch):
+    calls = []
+
+    async def fake_fetch(url, headers=None, read_timeout=None):
+        calls.append(url)
+        # 第一个请求卡住, 对冲发出的第二个请求很快返回
+        await asyncio.sleep(10 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    hedger = Hedger("网页", enabled=True, min_samples=1, min_delay=0.02)
+    hedger.latency.record("example.com", 0.02)
+    monkeypatch.setattr(downloader, "_fetch", fake_fetch)
+    monkeypatch.setattr(downloader, "page_hedger", hedger)
+    monkeypatch.setattr(downloader, "fetch_flight", SingleFlight())
+    monkeypatch.setattr(downloader, "alternate_mirror_url", lambda url: None)
+
+    assert asyncio.run(downloader.fetch_page("http://example.com/comic/a")) == 2
+    assert calls == ["http://example.com/comic/a"] * 2
+    assert (hedger.hedges_started, hedger.hedges_won) == (1, 1)
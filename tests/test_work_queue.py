@@ -0,0 +1,58 @@
+# tests/test_work_queue.py
+import time
+import pytest
+from work_queue import WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=60, max_attempts=2)
+    queue.enqueue("http://example.com/ch/1", "第1话", "comic/a", "a")
+    yield queue
+    queue.close()
+
+
+def expire_leases(queue):
+    queue._conn.execute("UPDATE chapters SET lease_expires = ? WHERE status = 'leased'", (time.time() - 1,))
+
+
+def test_claim_returns_current_lease(queue):
+    task = queue.claim("w1")
+    assert task["worker_id"] == "w1"
+    assert task["status"] == "leased"
+    assert task["attempts"] == 1
+    assert task["lease_expires"] > time.time()
+
+    expire_leases(queue)
+    task = queue.claim("w2")
+    assert task["worker_id"] == "w2"
+    assert task["attempts"] == 2
+    assert task["lease_expires"] > time.time()
+
+
+def test_expired_lease_stops_after_max_attempts(queue):
+    for worker_id in ("w1", "w2"):
+        assert queue.claim(worker_id) is not None
+        expire_leases(queue)
+    assert queue.claim("w3") is None
+    assert queue.counts() == {"error": 1}
+    assert not queue.has_pending()
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    task = queue.claim("w1")
+    assert queue.fail(task["chapter_url"], "w1", "boom")
+    assert queue.counts() == {"waiting": 1}
+    task = queue.claim("w1")
+    assert queue.fail(task["chapter_url"], "w1", "boom")
+    assert queue.counts() == {"error": 1}
+
+
+def test_renew_rejects_lost_lease(queue):
+    task = queue.claim("w1")
+    expire_leases(queue)
+    queue.claim("w2")
+    assert not queue.renew(task["chapter_url"], "w1")
+    assert queue.renew(task["chapter_url"], "w2")
+    assert queue.complete(task["chapter_url"], "w2")
+    assert queue.counts() == {"completed": 1}
@@ -6,17 +6,324 @@ import logging
 import os
 import datetime
 import glob
+import time
+import threading
+import collections
+from collections import OrderedDict
 
 INVALID_CHAR_REGEX = re.compile(r'[\\/:*?"<>|]')
 MAX_CONCURRENT_DOWNLOADS = 5
 MAX_LOG_FILES = 5  # 最大日志文件数量
 
+# 统一的请求头 (网页和图片请求共用)
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+DEFAULT_HEADERS = {'User-Agent': USER_AGENT}
+
+# 连接池配置
+MAX_CONCURRENT_IMAGES = 2  # 单个章节同时下载的图片数
+HTML_POOL_SIZE = 2  # 每个镜像站的网页连接数
+IMAGE_POOL_SIZE = 4  # 图片 CDN 连接池大小 (比并发数多一些, 留给预热连接)
+DNS_CACHE_TTL = 300  # DNS 缓存时间 (秒)
+KEEPALIVE_TIMEOUT = 60  # 空闲连接保持时间 (秒), 覆盖章节之间的间隔
+
+# 图片下载超时配置
+CONNECT_TIMEOUT = 10  # 建立连接 (秒)
+FIRST_BYTE_TIMEOUT = 10  # 发出请求到收到响应头 (秒), 不应大于 READ_IDLE_TIMEOUT
+READ_IDLE_TIMEOUT = 15  # 两次收到数据之间的最长间隔 (秒)
+MIN_DOWNLOAD_SPEED = 2048  # 最低传输速度 (字节/秒), 低于该速度的连接会被中断并重试
+SPEED_CHECK_WINDOW = 5  # 传输速度的统计窗口 (秒)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # 读取响应的块大小
+
+# 对冲请求配置 (慢请求超过 p95 延迟后发出备用请求)
+HEDGE_ENABLED = True  # 设为 False 关闭对冲
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20  # 样本数不足时不对冲
+HEDGE_MIN_DELAY = 0.5  # 最短对冲等待时间 (秒)
+HEDGE_MAX_EXTRA_RATIO = 0.1  # 对冲产生的额外请求最多占普通请求的比例
+
+# 出口代理池配置 (proxies.json 不存在或为空时直连)
+PROXY_EJECT_FAILURES = 3  # 连续失败多少次后暂时移出代理池
+PROXY_PROBE_INTERVAL = 30  # 移出后首次重新探测的等待时间 (秒), 之后每次翻倍
+PROXY_PROBE_MAX_INTERVAL = 300  # 重新探测的最长等待时间 (秒)
+
+# 内存中图片数据的全局上限 (正在下载 + 等待写入磁盘), 磁盘跟不上时暂停新的下载
+MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+DEFAULT_IMAGE_ESTIMATE = 512 * 1024  # 还没有样本时, 预留给每张图片的字节数
+
 
 def sanitize_filename(filename):
     """删除文件名中的非法字符"""
     return INVALID_CHAR_REGEX.sub('_', filename)
 
 
+def parse_chapter_range(spec, count):
+    """解析章节范围 (从 1 开始, 例如 "1-50,60,70-"), 返回 0 开始的下标列表"""
+    if not spec:
+        return list(range(count))
+    indexes = []
+    seen = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, _, end = part.partition("-")
+            start = int(start) if start.strip() else 1
+            end = int(end) if end.strip() else count
+        else:
+            start = end = int(part)
+        if start < 1 or end < start:
+            raise ValueError(f"无效的章节范围: {part}")
+        for index in range(start - 1, min(end, count)):
+            if index not in seen:
+                seen.add(index)
+                indexes.append(index)
+    return indexes
+
+
+def format_size(num_bytes):
+    """把字节数格式化为易读的字符串"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return f"{num_bytes:.0f}{unit}" if unit == "B" else f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+
+
+def format_duration(seconds):
+    """把秒数格式化为 时:分:秒, None 显示为 --:--"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class TTLCache:
+    """带过期时间的 LRU 缓存"""
+
+    def __init__(self, maxsize=128, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (过期时间, value)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+
+_MISSING = object()
+
+
+class _SyncCall:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并相同 key 的并发调用: 只执行一次, 所有调用方共享结果; 成功的结果可以短暂缓存"""
+
+    def __init__(self, cache_ttl=0, cache_size=128, cacheable=bool):
+        self._cache = TTLCache(cache_size, cache_ttl) if cache_ttl else None
+        self._cacheable = cacheable  # 判断结果是否可以缓存 (默认不缓存空结果)
+        self._inflight = {}  # key -> asyncio.Task
+        self._waiters = {}  # asyncio.Task -> 正在等待它的调用方数量
+        self._sync_calls = {}  # key -> _SyncCall
+        self._lock = threading.Lock()
+
+    def _cache_get(self, key):
+        if self._cache is None:
+            return _MISSING
+        with self._lock:
+            return self._cache.get(key, _MISSING)
+
+    def _cache_set(self, key, result):
+        if self._cache is not None and self._cacheable(result):
+            with self._lock:
+                self._cache.set(key, result)
+
+    def forget(self, key):
+        """丢弃缓存的结果"""
+        if self._cache is not None:
+            with self._lock:
+                self._cache.pop(key)
+
+    async def do(self, key, func):
+        """异步版本: func 是返回协程的函数
+
+        某个调用方被取消不会影响其他调用方; 所有调用方都被取消 (或超时) 时, 共享的请求也会被取消
+        """
+        result = self._cache_get(key)
+        if result is not _MISSING:
+            return result
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._on_done(key, done))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # 最后一个调用方也放弃了, 之后的调用重新发起请求
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+                    task.cancel()
+
+    def _on_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._cache_set(key, task.result())
+
+    def do_sync(self, key, func):
+        """同步版本 (多线程调用时合并)"""
+        result = self._cache_get(key)
+        if result is not _MISSING:
+            return result
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync_calls[key] = _SyncCall()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_calls[key]
+            call.event.set()
+        self._cache_set(key, call.result)
+        return call.result
+
+
+class ByteBudget:
+    """全局字节预算: reserve() 在预算用完时等待, 直到其他图片写入磁盘后释放
+
+    预留量先按平均图片大小估计, 拿到数据后用 resize() 改成实际大小。
+    """
+
+    def __init__(self, limit=MAX_INFLIGHT_BYTES, default_estimate=DEFAULT_IMAGE_ESTIMATE):
+        self.limit = limit
+        self.in_use = 0
+        self.waiting = 0  # 因预算不足而等待的次数 (统计用)
+        self._average = default_estimate
+        self._waiters = collections.deque()
+
+    @property
+    def estimate(self):
+        return int(self._average)
+
+    def _has_room(self, nbytes):
+        # 预算为空时总是放行, 避免单个超大的图片永远等待
+        return self.in_use == 0 or self.in_use + nbytes <= self.limit
+
+    async def acquire(self, nbytes):
+        self._wake()  # 顺便清理已取消的等待者
+        if not self._waiters and self._has_room(nbytes):
+            self.in_use += nbytes
+            return
+        self.waiting += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((waiter, nbytes))
+        try:
+            await waiter
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # 已经分配到预算时被取消, 归还
+                self.release(nbytes)
+            else:
+                waiter.cancel()
+            raise
+
+    def release(self, nbytes):
+        self.in_use = max(0, self.in_use - nbytes)
+        self._wake()
+
+    def resize(self, old, new):
+        """把一次预留从 old 改成 new 字节 (实际大小), 并更新平均大小"""
+        self._average += 0.2 * (new - self._average)
+        self.in_use = max(0, self.in_use + new - old)
+        self._wake()
+
+    def _wake(self):
+        # 按先来先到的顺序放行, 避免大图片一直被后来的小图片插队
+        while self._waiters:
+            waiter, nbytes = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if not self._has_room(nbytes):
+                break
+            self._waiters.popleft()
+            self.in_use += nbytes
+            waiter.set_result(None)
+
+    def reserve(self, nbytes=None):
+        """async with budget.reserve() as reservation: ... reservation.resize(len(data))"""
+        return _Reservation(self, self.estimate if nbytes is None else nbytes)
+
+
+class _Reservation:
+    __slots__ = ("budget", "nbytes")
+
+    def __init__(self, budget, nbytes):
+        self.budget = budget
+        self.nbytes = nbytes
+
+    def resize(self, nbytes):
+        self.budget.resize(self.nbytes, nbytes)
+        self.nbytes = nbytes
+
+    async def __aenter__(self):
+        await self.budget.acquire(self.nbytes)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.budget.release(self.nbytes)
+
+
 def windows_asyncio_fix():
     """解决 Windows 上 aiodns 的兼容性问题"""
     if platform.system() == 'Windows':
@@ -0,0 +1,132 @@
+# work_queue.py
+import os
+import sqlite3
+import time
+from utils import setup_logger, sanitize_filename
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 共享队列文件路径
+WORK_QUEUE_FILE = "work_queue.db"
+# 租约时长 (秒), worker 需要在过期前续约, 否则章节会被其他 worker 领走
+LEASE_SECONDS = 120
+# 章节最多尝试次数, 超过后标记为 error
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters (
+    chapter_url TEXT PRIMARY KEY,
+    chapter_name TEXT NOT NULL,
+    comic_name TEXT NOT NULL,
+    download_folder TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'waiting',
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chapters_status ON chapters (status, lease_expires);
+"""
+
+
+class WorkQueue:
+    """基于 SQLite 的持久化章节队列 (多进程/多机器共享, 带租约)"""
+
+    def __init__(self, path=WORK_QUEUE_FILE, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # 共享文件系统上不使用 WAL (网络文件系统不支持共享内存), 由 busy timeout 处理锁等待
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def enqueue(self, chapter_url, chapter_name, comic_download_folder, comic_name):
+        """添加章节, 已存在的章节会被忽略, 返回是否新增"""
+        download_folder = os.path.join(comic_download_folder, sanitize_filename(chapter_name))
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO chapters (chapter_url, chapter_name, comic_name, download_folder, updated) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (chapter_url, chapter_name, comic_name, download_folder, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def claim(self, worker_id):
+        """领取一个等待中或租约已过期的章节, 没有可领取的章节时返回 None"""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 租约过期且已用完尝试次数的章节 (worker 反复崩溃或卡住) 直接标记为 error, 不再领取
+            expired = self._conn.execute(
+                "UPDATE chapters SET status = 'error', lease_expires = NULL, "
+                "error = COALESCE(error, '租约多次过期'), updated = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            if expired.rowcount:
+                logger.warning(f"{expired.rowcount} 个章节租约过期且超过最大尝试次数, 标记为 error")
+            row = self._conn.execute(
+                "SELECT * FROM chapters WHERE status = 'waiting' "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY rowid LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            if row["status"] == "leased":
+                logger.warning(f"回收过期租约: {row['chapter_name']} (原 worker: {row['worker_id']})")
+            self._conn.execute(
+                "UPDATE chapters SET status = 'leased', worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE chapter_url = ?",
+                (worker_id, now + self.lease_seconds, now, row["chapter_url"]),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        task = dict(row)
+        task.update(status="leased", worker_id=worker_id, lease_expires=now + self.lease_seconds,
+                    attempts=row["attempts"] + 1, updated=now)
+        return task
+
+    def renew(self, chapter_url, worker_id):
+        """续约, 如果租约已经被其他 worker 回收则返回 False"""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE chapters SET lease_expires = ?, updated = ? "
+            "WHERE chapter_url = ? AND worker_id = ? AND status = 'leased'",
+            (now + self.lease_seconds, now, chapter_url, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, chapter_url, worker_id):
+        cursor = self._conn.execute(
+            "UPDATE chapters SET status = 'completed', lease_expires = NULL, error = NULL, updated = ? "
+            "WHERE chapter_url = ? AND worker_id = ?",
+            (time.time(), chapter_url, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, chapter_url, worker_id, error):
+        """记录失败, 未超过最大尝试次数的章节放回等待队列"""
+        cursor = self._conn.execute(
+            "UPDATE chapters SET status = CASE WHEN attempts < ? THEN 'waiting' ELSE 'error' END, "
+            "lease_expires = NULL, error = ?, updated = ? WHERE chapter_url = ? AND worker_id = ?",
+            (self.max_attempts, str(error), time.time(), chapter_url, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def counts(self):
+        """各状态的章节数"""
+        rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM chapters GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def has_pending(self):
+        """是否还有未完成的章节 (等待中或被领取)"""
+        counts = self.counts()
+        return counts.get("waiting", 0) + counts.get("leased", 0) > 0
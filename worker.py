@@ -0,0 +1,138 @@
+# worker.py
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+from downloader import download_images_async, get_image_links, get_chapter_list, close_session
+from work_queue import WorkQueue, WORK_QUEUE_FILE
+from utils import windows_asyncio_fix, setup_logger, sanitize_filename
+
+# 获取 logger 实例
+logger = setup_logger(__name__)
+
+# 队列为空时的轮询间隔 (秒)
+POLL_INTERVAL = 5
+
+
+async def process_chapter(queue, worker_id, task):
+    """下载一个已领取的章节, 期间定时续约"""
+    failed = 0
+
+    def progress_callback(downloaded, total):
+        nonlocal failed
+        if not downloaded:
+            failed += total
+
+    async def download():
+        img_links = await get_image_links(task["chapter_url"])
+        if not img_links:
+            raise RuntimeError("获取图片链接失败")
+        await download_images_async(img_links, task["download_folder"], progress_callback,
+                                    chapter_url=task["chapter_url"])
+
+    download_task = asyncio.create_task(download())
+    try:
+        while True:
+            done, _ = await asyncio.wait({download_task}, timeout=queue.lease_seconds / 3)
+            if done:
+                break
+            if not queue.renew(task["chapter_url"], worker_id):
+                logger.warning(f"租约已丢失, 放弃章节: {task['chapter_name']}")
+                download_task.cancel()
+                return
+        download_task.result()
+        if failed:
+            raise RuntimeError(f"{failed} 张图片下载失败")
+        queue.complete(task["chapter_url"], worker_id)
+        logger.info(f"[{worker_id}] 章节完成: {task['comic_name']} {task['chapter_name']}")
+    except asyncio.CancelledError:
+        download_task.cancel()
+        raise
+    except Exception as e:
+        logger.error(f"[{worker_id}] 章节失败: {task['chapter_name']}, 错误: {e}")
+        queue.fail(task["chapter_url"], worker_id, e)
+
+
+async def worker_loop(queue_path, worker_id, exit_when_empty=True):
+    queue = WorkQueue(queue_path)
+    logger.info(f"worker 启动: {worker_id}")
+    try:
+        while True:
+            task = queue.claim(worker_id)
+            if task is None:
+                if exit_when_empty and not queue.has_pending():
+                    break
+                # 其他 worker 还持有租约, 等待它们完成或过期
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            await process_chapter(queue, worker_id, task)
+    finally:
+        await close_session()
+        queue.close()
+        logger.info(f"worker 退出: {worker_id}")
+
+
+def run_worker(queue_path, exit_when_empty=True):
+    """单个 worker 进程的入口"""
+    windows_asyncio_fix()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    asyncio.run(worker_loop(queue_path, worker_id, exit_when_empty))
+
+
+def enqueue_comic(queue_path, comic_url, comic_name=None):
+    """把漫画的全部章节加入共享队列"""
+    chapters = get_chapter_list(comic_url)
+    if comic_name is None:
+        comic_name = comic_url.rstrip("/").rsplit("/", 1)[-1]
+    comic_name = sanitize_filename(comic_name)
+    comic_download_folder = os.path.join("comic", comic_name)
+    queue = WorkQueue(queue_path)
+    try:
+        added = sum(
+            queue.enqueue(chapter["url"], chapter["name"], comic_download_folder, comic_name)
+            for chapter in chapters
+        )
+    finally:
+        queue.close()
+    logger.info(f"已加入队列: {comic_name}, 新增 {added}/{len(chapters)} 个章节")
+    return added, len(chapters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程下载 worker (通过共享 SQLite 队列协调)")
+    parser.add_argument("--queue", default=WORK_QUEUE_FILE, help="共享队列文件路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="把漫画的章节加入队列")
+    enqueue_parser.add_argument("comic_url")
+    enqueue_parser.add_argument("--name", help="漫画名 (默认取 URL 最后一段)")
+
+    run_parser = subparsers.add_parser("run", help="启动 worker 进程")
+    run_parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    run_parser.add_argument("--forever", action="store_true", help="队列为空时继续等待新章节")
+
+    subparsers.add_parser("status", help="查看队列状态")
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        added, total = enqueue_comic(args.queue, args.comic_url, args.name)
+        print(f"新增 {added}/{total} 个章节")
+    elif args.command == "run":
+        processes = [
+            multiprocessing.Process(target=run_worker, args=(args.queue, not args.forever))
+            for _ in range(max(1, args.processes))
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    elif args.command == "status":
+        queue = WorkQueue(args.queue)
+        print(queue.counts())
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()